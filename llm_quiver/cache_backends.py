@@ -0,0 +1,176 @@
+import hashlib
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from loguru import logger
+from .cache_manager import CacheBackend, CacheManager
+
+
+def _key_digest(key: str) -> bytes:
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class ShardedSQLiteCacheBackend(CacheBackend):
+    """
+    Spread keys over `num_shards` SQLite files by key hash.
+
+    Every shard has its own database lock, so concurrent writers (threads or
+    processes) only contend when they hit the same shard. The files are named
+    `{cache_prefix}.{shard:03d}.cache` in `cache_dir`; the number of shards must
+    not change once a cache has been written.
+    """
+
+    def __init__(self, cache_dir, cache_prefix, num_shards=8, backup_interval=0):
+        super().__init__()
+        if num_shards < 1:
+            raise ValueError(f"num_shards must be positive, got {num_shards}.")
+        self.cache_dir = Path(cache_dir)
+        self.num_shards = num_shards
+        self.shards = [
+            CacheManager(self.cache_dir / f"{cache_prefix}.{shard:03d}.cache", backup_interval=backup_interval)
+            for shard in range(num_shards)
+        ]
+
+    def shard_of(self, key: str) -> int:
+        return int.from_bytes(_key_digest(key)[:8], "big") % self.num_shards
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.shards[self.shard_of(key)].get_item(key)
+        self.record_lookup(1 if value is not None else 0, 1)
+        return value
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        grouped = {}
+        for idx, key in enumerate(keys):
+            grouped.setdefault(self.shard_of(key), []).append(idx)
+
+        values = [None] * len(keys)
+        for shard, indices in grouped.items():
+            shard_values = self.shards[shard].get_many([keys[idx] for idx in indices])
+            for idx, value in zip(indices, shard_values):
+                values[idx] = value
+        self.record_lookup(sum(value is not None for value in values), len(keys))
+        return values
+
+    def set(self, key: str, value: str):
+        self.shards[self.shard_of(key)].set_item(key, value)
+
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        grouped = {}
+        for key, value in items:
+            grouped.setdefault(self.shard_of(key), []).append((key, value))
+        for shard, shard_items in grouped.items():
+            self.shards[shard].set_many(shard_items)
+
+    def delete(self, key: str):
+        self.shards[self.shard_of(key)].delete(key)
+
+    def stats(self):
+        stats = super().stats()
+        counts = [shard.count() for shard in self.shards]
+        stats.update(backend="sharded_sqlite", num_shards=self.num_shards, count=sum(counts), shard_counts=counts)
+        return stats
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Store responses in a Redis (or Redis-protocol compatible) server shared by many hosts.
+
+    Keys are stored as `{namespace}:{sha256(key)}` so long message lists do not
+    become long Redis keys. Requires the `redis` package.
+    """
+
+    def __init__(self, url, namespace="llm_quiver", ttl=None, client=None):
+        super().__init__()
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("The redis cache backend requires redis. "
+                                  "Please install it with `pip install redis`.")
+            client = redis.Redis.from_url(url)
+        self.url = url
+        self.namespace = namespace
+        self.ttl = ttl
+        self.client = client
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{_key_digest(key).hex()}"
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._decode(self.client.get(self._redis_key(key)))
+        self.record_lookup(1 if value is not None else 0, 1)
+        return value
+
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        if len(keys) == 0:
+            return []
+        values = [self._decode(value) for value in self.client.mget([self._redis_key(key) for key in keys])]
+        self.record_lookup(sum(value is not None for value in values), len(keys))
+        return values
+
+    def set(self, key: str, value: str):
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        pipe = self.client.pipeline(transaction=False)
+        num_items = 0
+        for key, value in items:
+            if value is None or (isinstance(value, str) and value.strip() == ""):
+                logger.warning(f"Value is None or empty for key: {key}")
+                continue
+            pipe.set(self._redis_key(key), value, ex=self.ttl)
+            num_items += 1
+        if num_items > 0:
+            pipe.execute()
+
+    def delete(self, key: str):
+        self.client.delete(self._redis_key(key))
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend="redis", url=self.url, namespace=self.namespace)
+        return stats
+
+    def close(self):
+        self.client.close()
+
+
+def create_cache_backend(
+    backend: str = "sqlite",
+    cache_dir=None,
+    cache_prefix: str = "default",
+    backup_interval: int = 0,
+    num_shards: int = 8,
+    url: Optional[str] = None,
+    ttl: Optional[int] = None,
+) -> CacheBackend:
+    """
+    Build the cache backend named by `backend`: "sqlite", "sharded_sqlite" or "redis".
+    """
+    if backend in ["sqlite", "sharded_sqlite"]:
+        if not cache_dir:
+            raise ValueError("caching is enabled but no cache directory is provided. "
+                             f"cache_dir's value: {cache_dir}")
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(exist_ok=True, parents=True)
+        if backend == "sqlite":
+            return CacheManager(cache_dir / f"{cache_prefix}.cache", backup_interval=backup_interval)
+        return ShardedSQLiteCacheBackend(cache_dir, cache_prefix, num_shards=num_shards,
+                                         backup_interval=backup_interval)
+    elif backend == "redis":
+        if not url:
+            raise ValueError("The redis cache backend requires cache_url.")
+        return RedisCacheBackend(url, namespace=cache_prefix, ttl=ttl)
+    else:
+        raise ValueError(f"Unsupported cache backend: {backend}. "
+                         "Supported backends are 'sqlite', 'sharded_sqlite' and 'redis'.")
@@ -1,16 +1,68 @@
 from pathlib import Path
 import sqlite3
 from loguru import logger
+import threading
 import time
 import shutil
+from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional, Tuple
 
 
-class CacheManager:
+class CacheBackend(ABC):
+    """
+    Interface of a key-value store for responses.
+
+    Keys are the JSON-dumped messages and values are the response strings.
+    Implementations must be safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.lookups = 0
+
+    def record_lookup(self, hits: int, lookups: int):
+        with self._stats_lock:
+            self.hits += hits
+            self.lookups += lookups
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> List[Optional[str]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str):
+        ...
+
+    @abstractmethod
+    def set_many(self, items: Iterable[Tuple[str, str]]):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def stats(self):
+        with self._stats_lock:
+            return {"hits": self.hits, "lookups": self.lookups}
+
+    def close(self):
+        pass
+
+
+class CacheManager(CacheBackend):
     def __init__(self, cache_path, backup_interval=0):
+        super().__init__()
         logger.info(f"Cache is in: {cache_path}")
         self.cache_path = Path(cache_path)
         is_first_run = not self.cache_path.exists()
-        self.conn = sqlite3.connect(cache_path)
+        #   The connection is shared by threads, every access goes through self.lock.
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(cache_path, check_same_thread=False, timeout=30)
         self.conn.execute('PRAGMA journal_mode=WAL')
         self.cursor = self.conn.cursor()
         if is_first_run:
@@ -31,9 +83,11 @@ class CacheManager:
         """
         Query the current number of records in the kv_cache table.
         """
-        self.cursor.execute('SELECT COUNT(*) FROM kv_cache')
-        count = self.cursor.fetchone()[0]
+        with self.lock:
+            self.cursor.execute('SELECT COUNT(*) FROM kv_cache')
+            count = self.cursor.fetchone()[0]
         logger.info(f"Now records count: {count}")
+        return count
 
     def set_item(self, key, value):
         """
@@ -57,29 +111,73 @@ class CacheManager:
         if value is None or (isinstance(value, str) and value.strip() == ""):
             logger.warning(f"Value is None or empty for key: {key}")
             return
-        try:
-            self.cursor.execute('''
-                INSERT INTO kv_cache (key, value) VALUES (?, ?)
-                ON CONFLICT(key) DO UPDATE SET value=excluded.value
-            ''', (key, value))
-            self.conn.commit()
-            self.count()
-            self.backup_cache()
-        except sqlite3.Error as e:
-            logger.error(f"Error inserting key-value: {e}")
-            self.conn.rollback()
+        with self.lock:
+            try:
+                self.cursor.execute('''
+                    INSERT INTO kv_cache (key, value) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value=excluded.value
+                ''', (key, value))
+                self.conn.commit()
+                self.count()
+                self.backup_cache()
+            except sqlite3.Error as e:
+                logger.error(f"Error inserting key-value: {e}")
+                self.conn.rollback()
+
+    def set_many(self, items):
+        """
+        Insert or update several key-value pairs in one transaction.
+
+        Pairs whose value is None or empty are skipped, like in `set_item`.
+        """
+        items = [(key, value) for key, value in items
+                 if not (value is None or (isinstance(value, str) and value.strip() == ""))]
+        if len(items) == 0:
+            return
+        with self.lock:
+            try:
+                self.cursor.executemany('''
+                    INSERT INTO kv_cache (key, value) VALUES (?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value=excluded.value
+                ''', items)
+                self.conn.commit()
+                self.count()
+                self.backup_cache()
+            except sqlite3.Error as e:
+                logger.error(f"Error inserting key-values: {e}")
+                self.conn.rollback()
 
     def get_item(self, key):
-        self.cursor.execute('''
-            SELECT value FROM kv_cache WHERE key=?
-        ''', (key,))
-        result = self.cursor.fetchone()
-        return result[0] if result else None
+        with self.lock:
+            self.cursor.execute('''
+                SELECT value FROM kv_cache WHERE key=?
+            ''', (key,))
+            result = self.cursor.fetchone()
+        value = result[0] if result else None
+        self.record_lookup(1 if value is not None else 0, 1)
+        return value
+
+    def get_many(self, keys):
+        """Return a list of values aligned with `keys`, None for missing keys."""
+        found = {}
+        #   Stay below SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds.
+        chunk_size = 500
+        with self.lock:
+            for start in range(0, len(keys), chunk_size):
+                chunk = keys[start:start + chunk_size]
+                placeholders = ",".join("?" * len(chunk))
+                self.cursor.execute(
+                    f"SELECT key, value FROM kv_cache WHERE key IN ({placeholders})", chunk)
+                found.update(self.cursor.fetchall())
+        values = [found.get(key) for key in keys]
+        self.record_lookup(sum(value is not None for value in values), len(keys))
+        return values
 
     def check_integrity(self):
         try:
-            self.cursor.execute("PRAGMA integrity_check")
-            result = self.cursor.fetchone()
+            with self.lock:
+                self.cursor.execute("PRAGMA integrity_check")
+                result = self.cursor.fetchone()
             return result[0] == "ok"
         except sqlite3.Error as e:
             logger.error(f"Error checking database integrity: {e}")
@@ -102,17 +200,33 @@ class CacheManager:
             logger.error("Cache integrity check failed. Backup not performed.")
 
     def delete(self, key):
-        self.cursor.execute('''
-            DELETE FROM kv_cache WHERE key=?
-        ''', (key,))
-        self.conn.commit()
+        with self.lock:
+            self.cursor.execute('''
+                DELETE FROM kv_cache WHERE key=?
+            ''', (key,))
+            self.conn.commit()
 
     def update(self, key, value):
         self.set(key, value)  # Reuse set method with conflict update logic
 
+    def get(self, key):
+        return self.get_item(key)
+
+    def set(self, key, value):
+        self.set_item(key, value)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend="sqlite", path=str(self.cache_path), count=self.count())
+        return stats
+
     def close(self):
+        if self.conn is None:
+            return
         self.backup_cache()
-        self.conn.close()
+        with self.lock:
+            self.conn.close()
+            self.conn = None
 
     def __del__(self):
         self.close()
@@ -0,0 +1,236 @@
+"""
+Bulk export, import and merge of SQLite response caches.
+
+Usage:
+    llm-quiver-cache export oai_cache/gpt-4o.cache gpt-4o.jsonl.gz
+    llm-quiver-cache import gpt-4o.jsonl.gz oai_cache/gpt-4o.cache --on-conflict keep
+    llm-quiver-cache merge oai_cache/gpt-4o.cache node1/gpt-4o.cache node2/gpt-4o.cache
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+from pathlib import Path
+from typing import Iterator, List, Tuple
+from loguru import logger
+
+#   How an incoming row is applied when its key already exists in the destination.
+#   "replace": the incoming value wins, "keep": the existing value wins,
+#   "longest": the longer value wins.
+CONFLICT_CLAUSES = {
+    "replace": "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+    "keep": "ON CONFLICT(key) DO NOTHING",
+    "longest": "ON CONFLICT(key) DO UPDATE SET value=excluded.value "
+               "WHERE length(excluded.value) > length(kv_cache.value)",
+}
+
+
+def _conflict_clause(on_conflict):
+    if on_conflict not in CONFLICT_CLAUSES:
+        raise ValueError(f"Unsupported conflict policy: {on_conflict}. "
+                         f"Supported policies are {list(CONFLICT_CLAUSES)}.")
+    return CONFLICT_CLAUSES[on_conflict]
+
+
+def _connect(cache_path):
+    #   URI filenames are enabled so that sources can be attached read-only.
+    conn = sqlite3.connect(Path(cache_path).resolve().as_uri(), uri=True)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS kv_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+    return conn
+
+
+def _infer_format(path):
+    name = Path(path).name
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith(".jsonl.gz"):
+        return "jsonl.gz"
+    if name.endswith(".jsonl"):
+        return "jsonl"
+    raise ValueError(f"Can't infer the format of {path}, use .jsonl, .jsonl.gz or .parquet.")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet support requires pyarrow. Please install it with `pip install pyarrow`.")
+    return pyarrow
+
+
+def iter_cache_chunks(cache_path, chunk_size=50000) -> Iterator[List[Tuple[str, str]]]:
+    """Read the (key, value) rows of a cache file in chunks, without loading it into memory."""
+    cache_path = Path(cache_path)
+    if not cache_path.exists():
+        raise ValueError(f"cache: {cache_path} is not found.")
+    conn = sqlite3.connect(f"{cache_path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute('SELECT key, value FROM kv_cache')
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+
+def export_cache(cache_path, dst, fmt=None, chunk_size=50000):
+    """
+    Export a cache to JSONL (optionally gzip-compressed) or Parquet.
+
+    Every JSONL line is `{"key": ..., "value": ...}`; Parquet files have the
+    string columns `key` and `value`. Returns the number of exported rows.
+    """
+    fmt = fmt or _infer_format(dst)
+    num_rows = 0
+    if fmt in ["jsonl", "jsonl.gz"]:
+        open_fn = gzip.open if fmt == "jsonl.gz" else open
+        with open_fn(dst, "wt", encoding="utf-8") as f:
+            for rows in iter_cache_chunks(cache_path, chunk_size):
+                f.write("".join(
+                    json.dumps(dict(key=key, value=value), ensure_ascii=False) + "\n" for key, value in rows))
+                num_rows += len(rows)
+    elif fmt == "parquet":
+        pa = _import_pyarrow()
+        schema = pa.schema([("key", pa.string()), ("value", pa.string())])
+        with pa.parquet.ParquetWriter(dst, schema, compression="zstd") as writer:
+            for rows in iter_cache_chunks(cache_path, chunk_size):
+                keys, values = zip(*rows)
+                writer.write_table(pa.table([list(keys), list(values)], schema=schema))
+                num_rows += len(rows)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}.")
+    logger.info(f"Exported {num_rows} rows from {cache_path} to {dst}")
+    return num_rows
+
+
+def iter_export_chunks(src, fmt=None, chunk_size=50000) -> Iterator[List[Tuple[str, str]]]:
+    """Read the (key, value) rows of an exported file in chunks."""
+    fmt = fmt or _infer_format(src)
+    if fmt in ["jsonl", "jsonl.gz"]:
+        open_fn = gzip.open if fmt == "jsonl.gz" else open
+        with open_fn(src, "rt", encoding="utf-8") as f:
+            rows = []
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                rows.append((item["key"], item["value"]))
+                if len(rows) >= chunk_size:
+                    yield rows
+                    rows = []
+            if rows:
+                yield rows
+    elif fmt == "parquet":
+        pa = _import_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(src)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=["key", "value"]):
+            columns = batch.to_pydict()
+            yield list(zip(columns["key"], columns["value"]))
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}.")
+
+
+def import_cache(src, cache_path, fmt=None, on_conflict="replace", chunk_size=50000):
+    """
+    Import an exported file into a cache, committing once per chunk.
+
+    Rows with an empty value are skipped. Returns the number of rows read.
+    """
+    sql = f"INSERT INTO kv_cache (key, value) VALUES (?, ?) {_conflict_clause(on_conflict)}"
+    conn = _connect(cache_path)
+    num_rows = 0
+    try:
+        for rows in iter_export_chunks(src, fmt, chunk_size):
+            rows = [(key, value) for key, value in rows if value is not None and value.strip() != ""]
+            with conn:
+                conn.executemany(sql, rows)
+            num_rows += len(rows)
+            logger.info(f"Imported {num_rows} rows into {cache_path}")
+    finally:
+        conn.close()
+    return num_rows
+
+
+def merge_caches(dst, srcs, on_conflict="replace"):
+    """
+    Merge several cache files into `dst` inside SQLite, one transaction per source.
+
+    Sources are attached to the destination database and copied with a single
+    `INSERT ... SELECT`, so rows never pass through Python. Shards written by
+    the sharded SQLite backend are plain cache files and can be merged too.
+    Returns the number of rows in `dst` after the merge.
+    """
+    sql = f'''
+        INSERT INTO kv_cache (key, value)
+        SELECT key, value FROM src.kv_cache
+        WHERE value IS NOT NULL AND trim(value) != ''
+        {_conflict_clause(on_conflict)}
+    '''
+    conn = _connect(dst)
+    try:
+        for src in srcs:
+            src = Path(src)
+            if not src.exists():
+                raise ValueError(f"cache: {src} is not found.")
+            if src.resolve() == Path(dst).resolve():
+                logger.warning(f"Skip merging {src} into itself.")
+                continue
+            conn.execute("ATTACH DATABASE ? AS src", (f"{src.resolve().as_uri()}?mode=ro",))
+            try:
+                with conn:
+                    cursor = conn.execute(sql)
+                logger.info(f"Merged {src} into {dst}, {cursor.rowcount} rows written.")
+            finally:
+                conn.execute("DETACH DATABASE src")
+        num_rows = conn.execute('SELECT COUNT(*) FROM kv_cache').fetchone()[0]
+    finally:
+        conn.close()
+    logger.info(f"Now records count: {num_rows}")
+    return num_rows
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="llm-quiver-cache", description="Export, import and merge LLMQuiver caches.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export a cache to .jsonl, .jsonl.gz or .parquet.")
+    export_parser.add_argument("cache_path")
+    export_parser.add_argument("dst")
+    export_parser.add_argument("--format", choices=["jsonl", "jsonl.gz", "parquet"], default=None)
+    export_parser.add_argument("--chunk-size", type=int, default=50000)
+
+    import_parser = subparsers.add_parser("import", help="Import an exported file into a cache.")
+    import_parser.add_argument("src")
+    import_parser.add_argument("cache_path")
+    import_parser.add_argument("--format", choices=["jsonl", "jsonl.gz", "parquet"], default=None)
+    import_parser.add_argument("--chunk-size", type=int, default=50000)
+    import_parser.add_argument("--on-conflict", choices=list(CONFLICT_CLAUSES), default="replace")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge cache files into a destination cache.")
+    merge_parser.add_argument("dst")
+    merge_parser.add_argument("srcs", nargs="+")
+    merge_parser.add_argument("--on-conflict", choices=list(CONFLICT_CLAUSES), default="replace")
+
+    args = parser.parse_args(args)
+    if args.command == "export":
+        export_cache(args.cache_path, args.dst, fmt=args.format, chunk_size=args.chunk_size)
+    elif args.command == "import":
+        import_cache(args.src, args.cache_path, fmt=args.format, on_conflict=args.on_conflict,
+                     chunk_size=args.chunk_size)
+    elif args.command == "merge":
+        merge_caches(args.dst, args.srcs, on_conflict=args.on_conflict)
+
+
+if __name__ == "__main__":
+    main()
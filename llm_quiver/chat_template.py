@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import Dict, List
+
+
+class ChatTemplate:
+    """
+    Render chat messages into a single prompt string on the client side.
+
+    The template uses the same jinja2 format as the `chat_template` shipped with
+    HuggingFace tokenizers (and served by vllm), so the file can usually be copied
+    from the model's `tokenizer_config.json`.
+    """
+
+    def __init__(self, template_path, bos_token: str = "", eos_token: str = ""):
+        try:
+            from jinja2.sandbox import ImmutableSandboxedEnvironment
+        except ImportError:
+            raise ImportError("Rendering chat templates requires jinja2. "
+                              "Please install it with `pip install jinja2`.")
+
+        template_path = Path(template_path)
+        if not template_path.exists():
+            raise ValueError(f"chat_template: {template_path} is not found.")
+
+        self.template_path = template_path
+        self.bos_token = bos_token
+        self.eos_token = eos_token
+
+        env = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+        env.globals["raise_exception"] = _raise_exception
+        self.template = env.from_string(template_path.read_text(encoding="utf-8"))
+
+    def render(self, messages: List[Dict], add_generation_prompt: bool = True) -> str:
+        return self.template.render(
+            messages=messages,
+            add_generation_prompt=add_generation_prompt,
+            bos_token=self.bos_token,
+            eos_token=self.eos_token,
+        )
+
+
+def _raise_exception(message):
+    raise ValueError(f"Chat template error: {message}")
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import threading
+import weakref
+import httpx
+from typing import Dict, Optional
+from loguru import logger
+from openai import AzureOpenAI, OpenAI, AsyncAzureOpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from .support_api import SupportAPI
+
+
+class PoolStats:
+    """
+    Connection counters of one shared HTTP pool.
+
+    Counts are collected with httpcore trace events, so `connections_opened`
+    only grows when a new TCP connection is made and `tls_handshakes` when a
+    new TLS session is negotiated. A high `connections_opened / requests`
+    ratio means connections are churning instead of being kept alive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+
+    def _incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def on_request(self, request):
+        self._incr("requests")
+        request.extensions["trace"] = self.trace
+
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            self._incr("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            self._incr("tls_handshakes")
+
+    async def aon_request(self, request):
+        self._incr("requests")
+        request.extensions["trace"] = self.atrace
+
+    async def atrace(self, event_name, info):
+        self.trace(event_name, info)
+
+    def as_dict(self):
+        with self._lock:
+            reuse_ratio = 1 - self.connections_opened / self.requests if self.requests else 0.0
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "tls_handshakes": self.tls_handshakes,
+                "reuse_ratio": reuse_ratio,
+            }
+
+
+class ClientPool:
+    """
+    Process-wide registry of OpenAI clients.
+
+    Clients are keyed by endpoint and credentials, so every `WrapOpenAI` pointing
+    at the same service shares one httpx connection pool. OpenAI clients are
+    thread-safe and can be used by several threads at the same time.
+
+    Async clients are bound to the event loop they were created in, so they are
+    registered per running loop and released together with it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients: Dict[tuple, object] = {}
+        self._stats: Dict[tuple, PoolStats] = {}
+        self._options: Dict[tuple, tuple] = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def make_key(api_type: SupportAPI, api_base: str, api_version: Optional[str], api_key: str):
+        key_digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+        return (api_type.value, api_base, api_version, key_digest)
+
+    def get_client(
+        self,
+        api_type: SupportAPI,
+        api_base: str,
+        api_version: Optional[str],
+        api_key: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+    ):
+        key = self.make_key(api_type, api_base, api_version, api_key)
+        options = (max_connections, max_keepalive_connections, keepalive_expiry, http2)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                if self._options[key] != options:
+                    logger.warning(f"Client for {api_base} already exists with pool options {self._options[key]}, "
+                                   f"ignoring {options}.")
+                return client
+
+            stats = PoolStats()
+            http_client = _build_http_client(
+                stats, max_connections, max_keepalive_connections, keepalive_expiry, http2)
+            if api_type == SupportAPI.AzureOpenAI:
+                client = AzureOpenAI(
+                    api_version=api_version,
+                    azure_endpoint=api_base,
+                    api_key=api_key,
+                    http_client=http_client,
+                )
+            else:
+                #   "openai" or "openai_like"
+                client = OpenAI(
+                    base_url=api_base,
+                    api_key=api_key,
+                    http_client=http_client,
+                )
+            logger.info(f"Created shared client for {api_base} (max_connections={max_connections}, "
+                        f"max_keepalive_connections={max_keepalive_connections}, http2={http2})")
+            self._clients[key] = client
+            self._stats[key] = stats
+            self._options[key] = options
+            return client
+
+    def get_async_client(
+        self,
+        api_type: SupportAPI,
+        api_base: str,
+        api_version: Optional[str],
+        api_key: str,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+    ):
+        """Same as `get_client`, but returns an async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        key = self.make_key(api_type, api_base, api_version, api_key)
+        with self._lock:
+            loop_clients = self._async_clients.setdefault(loop, {})
+            client = loop_clients.get(key)
+            if client is not None:
+                return client
+
+            stats = self._stats.setdefault(key, PoolStats())
+            self._options.setdefault(key, (max_connections, max_keepalive_connections, keepalive_expiry, http2))
+            http_client = _build_http_client(
+                stats, max_connections, max_keepalive_connections, keepalive_expiry, http2, is_async=True)
+            if api_type == SupportAPI.AzureOpenAI:
+                client = AsyncAzureOpenAI(
+                    api_version=api_version,
+                    azure_endpoint=api_base,
+                    api_key=api_key,
+                    http_client=http_client,
+                )
+            else:
+                client = AsyncOpenAI(
+                    base_url=api_base,
+                    api_key=api_key,
+                    http_client=http_client,
+                )
+            loop_clients[key] = client
+            return client
+
+    def stats(self, key=None):
+        """
+        Return the connection counters of every pool, keyed by `api_type:api_base:key_digest`,
+        or only the counters of the pool registered under `key`.
+        """
+        with self._lock:
+            if key is not None:
+                stats = self._stats.get(key)
+                return stats.as_dict() if stats else None
+            return {f"{key[0]}:{key[1]}:{key[3][:8]}": stats.as_dict() for key, stats in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._stats.clear()
+            self._options.clear()
+
+
+def _build_http_client(stats, max_connections, max_keepalive_connections, keepalive_expiry, http2, is_async=False):
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise ImportError("http2 requires the h2 package. Please install it with `pip install httpx[http2]`.")
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    if is_async:
+        return DefaultAsyncHttpxClient(limits=limits, http2=http2, event_hooks={"request": [stats.aon_request]})
+    return DefaultHttpxClient(limits=limits, http2=http2, event_hooks={"request": [stats.on_request]})
+
+
+client_pool = ClientPool()
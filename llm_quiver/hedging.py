@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from loguru import logger
+
+
+class LatencyTracker:
+    """Sliding window of recent request latencies."""
+
+    def __init__(self, window_size=1000, min_samples=20):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window_size)
+
+    def record(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Return the q-th percentile in seconds, None until `min_samples` latencies are recorded."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        idx = min(len(latencies) - 1, int(len(latencies) * q / 100))
+        return latencies[idx]
+
+
+class RequestHedger:
+    """
+    Send a duplicate request when the first one is slower than usual.
+
+    If a request has not finished after the `percentile`-th percentile of recent
+    latencies, the same request is sent to the next endpoint. The first successful
+    response wins and the other request is cancelled. At most `budget` hedges are
+    sent per request, e.g. 0.05 caps the extra load at 5%.
+
+    Requests run as coroutines on a background event loop owned by the hedger, so
+    that the losing request can really be cancelled.
+    """
+
+    def __init__(self, num_endpoints=1, percentile=95, budget=0.05, min_samples=20, window_size=1000):
+        self.num_endpoints = num_endpoints
+        self.percentile = percentile
+        self.budget = budget
+        self.latency = LatencyTracker(window_size=window_size, min_samples=min_samples)
+
+        self._lock = threading.Lock()
+        self._next_endpoint = 0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _get_loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-quiver-hedger", daemon=True).start()
+            return self._loop
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def _hedge_endpoint(self) -> int:
+        """Endpoint of the next hedge, round robin over the endpoints other than the primary one."""
+        if self.num_endpoints == 1:
+            return 0
+        with self._lock:
+            endpoint = self._next_endpoint % (self.num_endpoints - 1) + 1
+            self._next_endpoint += 1
+        return endpoint
+
+    async def _timed(self, request: Awaitable, record_on_cancel: bool = False):
+        start_time = time.perf_counter()
+        try:
+            result = await request
+        except asyncio.CancelledError:
+            #   A primary that lost to its hedge took at least this long. Dropping it would
+            #   leave only the fast requests in the window and lower the hedge delay.
+            if record_on_cancel:
+                self.latency.record(time.perf_counter() - start_time)
+            raise
+        self.latency.record(time.perf_counter() - start_time)
+        return result
+
+    async def _run(self, make_request: Callable[[int], Awaitable]):
+        with self._lock:
+            self.requests += 1
+
+        primary = asyncio.ensure_future(self._timed(make_request(0), record_on_cancel=True))
+        tasks = [primary]
+        hedge_delay = self.latency.percentile(self.percentile)
+        if hedge_delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done and self._acquire_hedge():
+                endpoint = self._hedge_endpoint()
+                logger.debug(f"Request is slower than {hedge_delay:.2f}s, hedging to endpoint {endpoint}.")
+                tasks.append(asyncio.ensure_future(self._timed(make_request(endpoint))))
+
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+            #   Every request failed, surface the error of the primary one.
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def run(self, make_request: Callable[[int], Awaitable]):
+        """
+        Run `make_request(endpoint_idx)` with hedging and return the first successful result.
+
+        `make_request` must return a new coroutine on each call; endpoint 0 is the primary one.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._run(make_request), self._get_loop())
+        return future.result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_delay": self.latency.percentile(self.percentile),
+            }
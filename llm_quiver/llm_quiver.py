@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional
 from . import io_util
 from .wrap_openai import WrapOpenAI
 from loguru import logger
@@ -8,7 +8,7 @@ from .prompt import prompt_template_parser
 
 
 class BaseLLMQuiver:
-    def __init__(self, config_path: str = None) -> None:
+    def __init__(self, config_path: str = None, output_parser: Optional[Callable[[str], Any]] = None) -> None:
         if config_path:
             self._initialize_by_config(config_path)
         else:
@@ -17,6 +17,8 @@ class BaseLLMQuiver:
 
         self.prompt_template = None
         self.prompt_template_type = "basic"
+        #   When set, responses are parsed with it and invalid ones are re-queried.
+        self.output_parser = output_parser
 
     def read_config(self, config_path):
         config_path = Path(config_path)
@@ -27,6 +29,18 @@ class BaseLLMQuiver:
             raise ValueError(f"LLMQUIVER_CONFIG: {config_path} is not found.")
         return config
 
+    def _optional_params(self, config):
+        """Collect the optional `WrapOpenAI` parameters that are present in the config."""
+        keys = [
+            "enable_batch", "batch_max_prompts", "batch_max_tokens", "chat_template",
+            "max_connections", "max_keepalive_connections", "keepalive_expiry", "http2",
+            "cache_backend", "cache_shards", "cache_url", "cache_ttl",
+            "enable_hedging", "hedge_api_bases", "hedge_percentile", "hedge_budget", "hedge_min_samples",
+            "max_requery", "parse_workers", "parse_in_processes",
+            "scheduler_workers", "requests_per_minute", "priority_shares",
+        ]
+        return {key: config[key] for key in keys if key in config}
+
     def _initialize_by_config(self, config_path: str = None):
         config = self.read_config(config_path)
         self.gen = WrapOpenAI(
@@ -42,6 +56,7 @@ class BaseLLMQuiver:
             cache_dir=config.get("cache_dir"),
             cache_prefix=config.get("cache_prefix", config["MODEL_NAME"]),
             cache_interval=config.get("cache_interval", 0),
+            **self._optional_params(config),
         )
 
     def _initialize_by_env(self):
@@ -76,6 +91,7 @@ class BaseLLMQuiver:
             cache_dir=config.get("cache_dir"),
             cache_prefix=config.get("cache_prefix", params["MODEL_NAME"]),
             cache_interval=config.get("cache_interval", 0),
+            **self._optional_params(config),
         )
 
     def get_num_tokens_from_string_fn(self):
@@ -91,7 +107,7 @@ class BaseLLMQuiver:
         return NotImplemented
 
     def generate(
-        self, prompt_values: List[str], verbose=False
+        self, prompt_values: List[str], verbose=False, priority="batch", deadline=None
     ):
         return NotImplemented
 
@@ -99,14 +115,20 @@ class BaseLLMQuiver:
         return NotImplemented
 
     def chat(
-        self, messages_list: List[Dict], verbose=False
+        self, messages_list: List[Dict], verbose=False, priority="batch", deadline=None
     ):
         return NotImplemented
 
+    def stream(self, messages, stop_predicate=None):
+        return NotImplemented
+
+    def astream(self, messages, stop_predicate=None):
+        return NotImplemented
+
 
 class LLMQuiver(BaseLLMQuiver):
-    def __init__(self, config_path: str = None) -> None:
-        super().__init__(config_path)
+    def __init__(self, config_path: str = None, output_parser: Optional[Callable[[str], Any]] = None) -> None:
+        super().__init__(config_path, output_parser=output_parser)
 
     def prepare_prompts(self, prompt_values):
         if not isinstance(prompt_values, list):
@@ -123,19 +145,29 @@ class LLMQuiver(BaseLLMQuiver):
         return messages_list
 
     def generate(
-        self, prompt_values: List[str], verbose=False
+        self, prompt_values: List[str], verbose=False, priority="batch", deadline=None
     ):
         logger.warning(
             "The generate() method is deprecated and will be removed in a future version. "
             "Please use chat() instead."
         )
         messages_list = self.prepare_prompts(prompt_values)
-        return self.gen.chatcomplete(messages_list=messages_list, verbose=verbose)
+        return self.gen.chatcomplete(
+            messages_list=messages_list, verbose=verbose, output_parser=self.output_parser,
+            priority=priority, deadline=deadline)
 
     def chat(
-        self, messages_list: List[List[Dict]], verbose=False
+        self, messages_list: List[List[Dict]], verbose=False, priority="batch", deadline=None
     ):
-        return self.gen.chatcomplete(messages_list=messages_list, verbose=verbose)
+        return self.gen.chatcomplete(
+            messages_list=messages_list, verbose=verbose, output_parser=self.output_parser,
+            priority=priority, deadline=deadline)
+
+    def stream(self, messages: List[Dict], stop_predicate=None):
+        return self.gen.stream(messages, stop_predicate=stop_predicate)
+
+    def astream(self, messages: List[Dict], stop_predicate=None):
+        return self.gen.astream(messages, stop_predicate=stop_predicate)
 
 
 class TomlLLMQuiver(BaseLLMQuiver):
@@ -143,9 +175,10 @@ class TomlLLMQuiver(BaseLLMQuiver):
         self,
         config_path=None,
         toml_template_file=None,
-        toml_prompt_name=None
+        toml_prompt_name=None,
+        output_parser=None
     ):
-        super().__init__(config_path)
+        super().__init__(config_path, output_parser=output_parser)
 
         if toml_template_file is None or toml_prompt_name is None:
             raise ValueError("toml_template_file is required for toml template type.")
@@ -209,7 +242,7 @@ class TomlLLMQuiver(BaseLLMQuiver):
         return messages_list
 
     def generate(
-        self, prompt_values: List[str], verbose=False
+        self, prompt_values: List[str], verbose=False, priority="batch", deadline=None
     ):
         logger.warning(
             "The generate() method is deprecated and will be removed in a future version. "
@@ -218,10 +251,22 @@ class TomlLLMQuiver(BaseLLMQuiver):
         if self.prompt_template_type != "basic":
             raise RuntimeError("Can't enable generate, because the template is not for 'basic'.")
         messages_list = self.prepare_prompts(prompt_values)
-        return self.gen.chatcomplete(messages_list=messages_list, verbose=verbose)
+        return self.gen.chatcomplete(
+            messages_list=messages_list, verbose=verbose, output_parser=self.output_parser,
+            priority=priority, deadline=deadline)
 
     def chat(
-        self, prompt_values: List[Dict], verbose=False
+        self, prompt_values: List[Dict], verbose=False, priority="batch", deadline=None
     ):
         messages_list = self.prepare_messages_list(prompt_values)
-        return self.gen.chatcomplete(messages_list=messages_list, verbose=verbose)
+        return self.gen.chatcomplete(
+            messages_list=messages_list, verbose=verbose, output_parser=self.output_parser,
+            priority=priority, deadline=deadline)
+
+    def stream(self, prompt_value: Dict, stop_predicate=None):
+        messages = self.prepare_messages_list([prompt_value])[0]
+        return self.gen.stream(messages, stop_predicate=stop_predicate)
+
+    def astream(self, prompt_value: Dict, stop_predicate=None):
+        messages = self.prepare_messages_list([prompt_value])[0]
+        return self.gen.astream(messages, stop_predicate=stop_predicate)
@@ -0,0 +1,42 @@
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Tuple
+from loguru import logger
+
+
+def try_parse(parser: Callable[[str], Any], response: str) -> Tuple[bool, Any]:
+    """Run `parser` on `response`, returning (True, parsed) or (False, error message)."""
+    try:
+        return True, parser(response)
+    except Exception as e:
+        return False, repr(e)
+
+
+class OutputValidator:
+    """
+    Parse responses in a worker pool while the remaining requests are still running.
+
+    `parser` turns a response string into a structured value and raises on invalid
+    output, e.g. `json.loads` or a pydantic model's `model_validate_json`. With a
+    process pool it must be picklable, i.e. defined at module level.
+    """
+
+    def __init__(self, parser: Callable[[str], Any], executor: Executor):
+        self.parser = parser
+        self.executor = executor
+        self._futures = {}
+
+    def submit(self, idx: int, response: str):
+        self._futures[idx] = self.executor.submit(try_parse, self.parser, response)
+
+    def collect(self) -> Tuple[Dict[int, Any], List[int]]:
+        """Wait for the submitted responses, returning the parsed values by index and the failed indices."""
+        parsed, failed = {}, []
+        for idx, future in sorted(self._futures.items()):
+            ok, value = future.result()
+            if ok:
+                parsed[idx] = value
+            else:
+                logger.debug(f"Response {idx} failed to parse: {value}")
+                failed.append(idx)
+        self._futures = {}
+        return parsed, failed
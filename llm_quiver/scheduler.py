@@ -0,0 +1,315 @@
+import heapq
+import itertools
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from loguru import logger
+from .hedging import LatencyTracker
+
+#   Priority classes in dispatch order, with the default share of workers and rate limit.
+DEFAULT_PRIORITY_SHARES = {
+    "interactive": 1.0,
+    "batch": 0.75,
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised on a scheduled request that was dropped because its deadline can't be met."""
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def available(self, now) -> bool:
+        self._refill(now)
+        return self.tokens >= 1
+
+    def acquire(self):
+        self.tokens -= 1
+
+    def wait_time(self, now) -> float:
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class PriorityClass:
+    def __init__(self, name, priority, share, num_workers, requests_per_minute=None, latency_min_samples=5):
+        self.name = name
+        self.priority = priority
+        self.share = share
+        #   While more urgent classes are busy, lower classes can't occupy every worker,
+        #   so urgent requests always find a free one.
+        self.max_in_flight = max(1, math.floor(share * num_workers))
+        self.in_flight = 0
+        self.bucket = None
+        if requests_per_minute:
+            rate = share * requests_per_minute / 60
+            self.bucket = TokenBucket(rate, capacity=max(1.0, rate))
+        #   Entries are (deadline, seq, request), earliest deadline first, then FIFO.
+        self.queue = []
+        self.dispatched = 0
+        self.dropped = 0
+        #   Latency of this class's API calls; deadlines are checked against its median.
+        self.latency = LatencyTracker(window_size=100, min_samples=latency_min_samples)
+        #   Requests dropped by the latency estimate since the last dispatch.
+        self.consecutive_drops = 0
+
+    def expected_latency(self) -> float:
+        return self.latency.percentile(50) or 0.0
+
+    def busy(self) -> bool:
+        return len(self.queue) > 0 or self.in_flight > 0
+
+
+class ScheduledRequest:
+    def __init__(self, fn: Callable, deadline: Optional[float], timed: bool = True):
+        self.fn = fn
+        self.deadline = deadline
+        self.timed = timed
+        self.future = Future()
+
+
+class RequestScheduler:
+    """
+    Dispatch requests to a pool of workers by priority class and deadline.
+
+    Every time a worker is free, the most urgent class with queued work, a free
+    worker slot and rate-limit tokens is served, so queued batch work is
+    preempted by newly submitted interactive requests. Within a class, requests
+    run earliest deadline first. A request whose deadline is sooner than the
+    median latency of its class is dropped with `DeadlineExceeded` instead of
+    being sent. Nothing is dropped by estimate until a class has
+    `latency_min_samples` samples, and after `probe_every` consecutive drops one
+    request is sent anyway, so the estimate recovers from slow outliers.
+
+    While a more urgent class has queued or running requests, a class is limited
+    to `share` of the workers and of `requests_per_minute`. Otherwise it borrows
+    the idle capacity and may use every worker and the whole rate; an urgent
+    request arriving then waits for the first worker to free up.
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 8,
+        requests_per_minute: Optional[float] = None,
+        priority_shares: Optional[Dict[str, float]] = None,
+        latency_min_samples: int = 5,
+        probe_every: int = 5,
+    ):
+        priority_shares = priority_shares or DEFAULT_PRIORITY_SHARES
+        self.num_workers = num_workers
+        self.probe_every = probe_every
+        self.classes = {
+            name: PriorityClass(name, priority, share, num_workers, requests_per_minute,
+                                latency_min_samples=latency_min_samples)
+            for priority, (name, share) in enumerate(priority_shares.items())
+        }
+        self.bucket = None
+        if requests_per_minute:
+            rate = requests_per_minute / 60
+            self.bucket = TokenBucket(rate, capacity=max(1.0, rate))
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._work, name=f"llm-quiver-scheduler-{idx}", daemon=True)
+            for idx in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable, priority: str = "batch", deadline: Optional[float] = None,
+               timed: bool = True) -> Future:
+        """
+        Queue `fn()` and return a Future of its result.
+
+        Args:
+            fn (callable): The request to run.
+            priority (str): Name of the priority class.
+            deadline (float, optional): Seconds from now after which the result is useless.
+            timed (bool): Record the run time of `fn` as the class latency. Pass False when
+                `fn` sleeps between retries and reports its API calls with `record_latency`.
+        """
+        if priority not in self.classes:
+            raise ValueError(f"Unsupported priority: {priority}. Supported priorities are {list(self.classes)}.")
+        request = ScheduledRequest(fn, time.monotonic() + deadline if deadline is not None else None, timed=timed)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The scheduler is closed.")
+            queue_deadline = request.deadline if request.deadline is not None else math.inf
+            heapq.heappush(self.classes[priority].queue, (queue_deadline, next(self._seq), request))
+            self._cond.notify()
+        return request.future
+
+    def expected_latency(self, priority: str) -> float:
+        return self.classes[priority].expected_latency()
+
+    def record_latency(self, priority: str, latency: float):
+        """Record the latency of one API call made by a request of class `priority`."""
+        self.classes[priority].latency.record(latency)
+
+    def _drop_expired(self, priority_class, now):
+        expected_latency = priority_class.expected_latency()
+        while priority_class.queue:
+            deadline, _, request = priority_class.queue[0]
+            if request.future.cancelled():
+                #   Cancelled by the caller while queued, there is nothing to run or report.
+                heapq.heappop(priority_class.queue)
+                continue
+            if deadline >= now + expected_latency:
+                break
+            if deadline >= now:
+                #   Only the estimate says it's too late: send a probe now and then.
+                if priority_class.consecutive_drops >= self.probe_every:
+                    break
+                priority_class.consecutive_drops += 1
+            heapq.heappop(priority_class.queue)
+            #   The caller may cancel concurrently; once running, the future can't be cancelled.
+            if request.future.set_running_or_notify_cancel():
+                priority_class.dropped += 1
+                request.future.set_exception(DeadlineExceeded(
+                    f"Deadline can't be met with an expected latency of {expected_latency:.2f}s."))
+
+    def _next_request(self):
+        """Pick the next request to run, or return how long to wait before trying again."""
+        now = time.monotonic()
+        wait_time = None
+        #   Whether a more urgent class has queued or running requests.
+        urgent_busy = False
+        for priority_class in sorted(self.classes.values(), key=lambda c: c.priority):
+            self._drop_expired(priority_class, now)
+            reserved = urgent_busy
+            urgent_busy = urgent_busy or priority_class.busy()
+            max_in_flight = priority_class.max_in_flight if reserved else self.num_workers
+            if not priority_class.queue or priority_class.in_flight >= max_in_flight:
+                continue
+            class_bucket = priority_class.bucket if reserved else None
+            if class_bucket is not None and not class_bucket.available(now):
+                class_wait = class_bucket.wait_time(now)
+                wait_time = class_wait if wait_time is None else min(wait_time, class_wait)
+                continue
+            if self.bucket is not None and not self.bucket.available(now):
+                return None, self.bucket.wait_time(now)
+
+            if class_bucket is not None:
+                class_bucket.acquire()
+            if self.bucket is not None:
+                self.bucket.acquire()
+            _, _, request = heapq.heappop(priority_class.queue)
+            priority_class.in_flight += 1
+            priority_class.dispatched += 1
+            priority_class.consecutive_drops = 0
+            return (priority_class, request), None
+        return None, wait_time
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    item, wait_time = self._next_request()
+                    if item is not None:
+                        break
+                    self._cond.wait(timeout=wait_time)
+            priority_class, request = item
+
+            if request.future.set_running_or_notify_cancel():
+                start_time = time.perf_counter()
+                try:
+                    request.future.set_result(request.fn())
+                    if request.timed:
+                        priority_class.latency.record(time.perf_counter() - start_time)
+                except Exception as e:
+                    request.future.set_exception(e)
+
+            with self._cond:
+                priority_class.in_flight -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                name: {
+                    "queued": len(priority_class.queue),
+                    "in_flight": priority_class.in_flight,
+                    "dispatched": priority_class.dispatched,
+                    "dropped": priority_class.dropped,
+                }
+                for name, priority_class in self.classes.items()
+            }
+
+    def close(self):
+        """Stop the workers, cancelling the requests that are still queued."""
+        with self._cond:
+            self._closed = True
+            for priority_class in self.classes.values():
+                for _, _, request in priority_class.queue:
+                    request.future.cancel()
+                priority_class.queue.clear()
+            self._cond.notify_all()
+        logger.info("Request scheduler closed.")
+
+
+class SchedulerPool:
+    """
+    Process-wide registry of request schedulers.
+
+    Schedulers are keyed by endpoint, credentials and model, so every `WrapOpenAI`
+    drawing on the same quota is paced by one scheduler and one `requests_per_minute`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._schedulers: Dict[tuple, RequestScheduler] = {}
+        self._options: Dict[tuple, tuple] = {}
+
+    def get_scheduler(
+        self,
+        key: tuple,
+        num_workers: int = 8,
+        requests_per_minute: Optional[float] = None,
+        priority_shares: Optional[Dict[str, float]] = None,
+    ) -> RequestScheduler:
+        options = (num_workers, requests_per_minute, tuple((priority_shares or DEFAULT_PRIORITY_SHARES).items()))
+        with self._lock:
+            scheduler = self._schedulers.get(key)
+            if scheduler is not None and not scheduler._closed:
+                if self._options[key] != options:
+                    logger.warning(f"Scheduler for {key[1]} already exists with options {self._options[key]}, "
+                                   f"ignoring {options}.")
+                return scheduler
+
+            scheduler = RequestScheduler(
+                num_workers=num_workers,
+                requests_per_minute=requests_per_minute,
+                priority_shares=priority_shares,
+            )
+            logger.info(f"Created shared scheduler for {key[1]} (num_workers={num_workers}, "
+                        f"requests_per_minute={requests_per_minute})")
+            self._schedulers[key] = scheduler
+            self._options[key] = options
+            return scheduler
+
+    def close(self):
+        with self._lock:
+            for scheduler in self._schedulers.values():
+                scheduler.close()
+            self._schedulers.clear()
+            self._options.clear()
+
+
+scheduler_pool = SchedulerPool()
@@ -0,0 +1,132 @@
+import json
+import time
+from typing import Callable, Dict, List, Optional
+from loguru import logger
+
+
+class BaseChatStream:
+    """
+    Shared state of a streaming chat completion.
+
+    Attributes:
+        text (str): The content assembled so far.
+        ttft (float): Seconds from sending the request to the first content delta,
+            None until it arrives. It is 0 for responses served from the cache.
+        total_time (float): Seconds from sending the request to the end of the stream.
+        stopped_early (bool): Whether `stop_predicate` cancelled the request.
+        cached (bool): Whether the response was served from the cache.
+    """
+
+    def __init__(self, wrap, messages: List[Dict], stop_predicate: Optional[Callable[[str], bool]] = None):
+        self.wrap = wrap
+        self.messages = messages
+        self.stop_predicate = stop_predicate
+        self.text = ""
+        self.ttft = None
+        self.total_time = None
+        self.stopped_early = False
+        self.cached = False
+        self._start_time = None
+
+    def _create_kwargs(self):
+        return dict(
+            model=self.wrap.modelname,
+            max_tokens=self.wrap.max_tokens,
+            temperature=self.wrap.temperature,
+            top_p=self.wrap.top_p,
+            timeout=self.wrap.timeout,
+            messages=self.messages,
+            stream=True,
+        )
+
+    def _get_cached(self):
+        if not self.wrap.enable_cache:
+            return None
+        response = self.wrap.gpt_cache.get(json.dumps(self.messages))
+        if response is not None and len(response) > 0:
+            self.text = response
+            self.ttft = 0.0
+            self.total_time = 0.0
+            self.cached = True
+            return response
+        return None
+
+    def _on_chunk(self, chunk):
+        """Append the content of `chunk`, returning the delta or None if it carries no content."""
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            return None
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start_time
+            logger.debug(f"Time to first token: {self.ttft:.3f}s")
+        self.text += delta
+        return delta
+
+    def _should_stop(self):
+        if self.stop_predicate is not None and self.stop_predicate(self.text):
+            self.stopped_early = True
+            return True
+        return False
+
+    def _finish(self):
+        self.total_time = time.perf_counter() - self._start_time
+        logger.debug(f"## response(stream)\n{self.text}")
+        #   A stream cut short by stop_predicate is not the full completion, so it is not cached.
+        if self.wrap.enable_cache and len(self.text) > 0 and not self.stopped_early:
+            self.wrap.gpt_cache.set(json.dumps(self.messages), self.text)
+
+
+class ChatStream(BaseChatStream):
+    """
+    Iterator over the content deltas of one chat completion.
+
+    When `stop_predicate(text)` returns True the HTTP response is closed, which
+    cancels the generation on the server. A completed stream is cached under the
+    same key as `WrapOpenAI.chatcomplete`; a stream stopped early is not cached.
+    """
+
+    def __iter__(self):
+        cached = self._get_cached()
+        if cached is not None:
+            yield cached
+            return
+
+        self._start_time = time.perf_counter()
+        response = self.wrap._client.chat.completions.create(**self._create_kwargs())
+        try:
+            for chunk in response:
+                delta = self._on_chunk(chunk)
+                if delta is None:
+                    continue
+                yield delta
+                if self._should_stop():
+                    break
+        finally:
+            response.close()
+        self._finish()
+
+
+class AsyncChatStream(BaseChatStream):
+    """Async counterpart of `ChatStream`."""
+
+    async def __aiter__(self):
+        cached = self._get_cached()
+        if cached is not None:
+            yield cached
+            return
+
+        self._start_time = time.perf_counter()
+        response = await self.wrap._get_async_client().chat.completions.create(**self._create_kwargs())
+        try:
+            async for chunk in response:
+                delta = self._on_chunk(chunk)
+                if delta is None:
+                    continue
+                yield delta
+                if self._should_stop():
+                    break
+        finally:
+            await response.close()
+        self._finish()
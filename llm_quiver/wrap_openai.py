@@ -1,15 +1,24 @@
 from openai import BadRequestError, APITimeoutError, RateLimitError
 import json
 import tiktoken
-from openai import AzureOpenAI, OpenAI
 import re
 import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 from tqdm import tqdm
-from pathlib import Path
 from loguru import logger
-from typing import Optional
+from typing import Dict, List, Optional, Union
 from .support_api import SupportAPI
-from .cache_manager import CacheManager
+from .cache_backends import create_cache_backend
+from .chat_template import ChatTemplate
+from .client_pool import client_pool
+from .streaming import ChatStream, AsyncChatStream
+from .hedging import RequestHedger
+from .output_validation import OutputValidator
+from .scheduler import DeadlineExceeded, scheduler_pool
+
+#   A rough, conservative ratio used to budget prompt tokens when no tokenizer is available.
+CHARS_PER_TOKEN = 3
 
 
 class WrapOpenAI:
@@ -27,7 +36,30 @@ class WrapOpenAI:
         enable_cache: bool = False,
         cache_dir: Optional[str] = None,
         cache_prefix: Optional[str] = None,
-        cache_interval: int = 0
+        cache_interval: int = 0,
+        cache_backend: str = "sqlite",
+        cache_shards: int = 8,
+        cache_url: Optional[str] = None,
+        cache_ttl: Optional[int] = None,
+        enable_batch: bool = False,
+        batch_max_prompts: int = 32,
+        batch_max_tokens: int = 16384,
+        chat_template: Optional[str] = None,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 5.0,
+        http2: bool = False,
+        enable_hedging: bool = False,
+        hedge_api_bases: Optional[List[Union[str, Dict]]] = None,
+        hedge_percentile: float = 95,
+        hedge_budget: float = 0.05,
+        hedge_min_samples: int = 20,
+        max_requery: int = 2,
+        parse_workers: int = 4,
+        parse_in_processes: bool = False,
+        scheduler_workers: int = 0,
+        requests_per_minute: Optional[float] = None,
+        priority_shares: Optional[Dict[str, float]] = None
     ):
         try:
             self.api_type = SupportAPI(api_type)
@@ -46,18 +78,74 @@ class WrapOpenAI:
         self.cache_dir = cache_dir
         self.cache_prefix = cache_prefix
         self.cache_interval = cache_interval
+        self.cache_backend = cache_backend
+        self.cache_shards = cache_shards
+        self.cache_url = cache_url
+        self.cache_ttl = cache_ttl
+        self.enable_batch = enable_batch
+        self.batch_max_prompts = batch_max_prompts
+        self.batch_max_tokens = batch_max_tokens
+        self.chat_template = None
+
+        if self.enable_batch:
+            if self.api_type != SupportAPI.OpenAILike:
+                raise ValueError("enable_batch only works when `api_type` is openai_like.")
+            if not chat_template:
+                raise ValueError("enable_batch requires a local chat_template to render messages.")
+            self.chat_template = ChatTemplate(chat_template)
 
-        if self.api_type == SupportAPI.AzureOpenAI:
-            self._client = AzureOpenAI(
-                api_version=self.api_version,
-                azure_endpoint=self.api_base,
-                api_key=self.api_key,
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+
+        #   Clients are shared by every instance with the same endpoint and credentials.
+        self._client = client_pool.get_client(
+            self.api_type,
+            self.api_base,
+            self.api_version,
+            self.api_key,
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+            http2=self.http2,
+        )
+
+        self.enable_hedging = enable_hedging
+        self.hedge_api_bases = hedge_api_bases or []
+        self.hedger = None
+        self._hedge_endpoints = []
+        if self.enable_hedging:
+            #   Endpoint 0 is api_base, hedges go to the other endpoints or to api_base again.
+            primary = dict(api_base=self.api_base, api_key=self.api_key, api_version=self.api_version)
+            self._hedge_endpoints = [primary]
+            for endpoint in self.hedge_api_bases:
+                endpoint = self._parse_hedge_endpoint(endpoint)
+                if endpoint not in self._hedge_endpoints:
+                    self._hedge_endpoints.append(endpoint)
+            self.hedger = RequestHedger(
+                num_endpoints=len(self._hedge_endpoints),
+                percentile=hedge_percentile,
+                budget=hedge_budget,
+                min_samples=hedge_min_samples,
             )
-        elif self.api_type in [SupportAPI.OpenAI, SupportAPI.OpenAILike]:
-            #   "openai" or "openai_like"
-            self._client = OpenAI(
-                base_url=self.api_base,
-                api_key=self.api_key,
+
+        self.max_requery = max_requery
+        self.parse_workers = parse_workers
+        self.parse_in_processes = parse_in_processes
+        self._parse_executor = None
+
+        self.scheduler_workers = scheduler_workers
+        self.requests_per_minute = requests_per_minute
+        self.scheduler = None
+        if self.scheduler_workers > 0:
+            #   Instances on the same quota share one scheduler, like they share one client.
+            scheduler_key = client_pool.make_key(self.api_type, self.api_base, self.api_version, self.api_key)
+            self.scheduler = scheduler_pool.get_scheduler(
+                scheduler_key + (self.modelname,),
+                num_workers=self.scheduler_workers,
+                requests_per_minute=self.requests_per_minute,
+                priority_shares=priority_shares,
             )
 
         self._log_format_parameters()
@@ -79,13 +167,58 @@ class WrapOpenAI:
             "timeout": self.timeout,
             "enable_cache": self.enable_cache,
             "cache_dir": self.cache_dir,
-            "cache_prefix": self.cache_prefix
+            "cache_prefix": self.cache_prefix,
+            "cache_backend": self.cache_backend,
+            "enable_batch": self.enable_batch,
+            "batch_max_prompts": self.batch_max_prompts,
+            "batch_max_tokens": self.batch_max_tokens,
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "enable_hedging": self.enable_hedging,
+            "hedge_api_bases": [endpoint["api_base"] for endpoint in self._hedge_endpoints[1:]],
+            "scheduler_workers": self.scheduler_workers,
+            "requests_per_minute": self.requests_per_minute,
         }
 
         # Formatting parameters for printing
         formatted_params = "\n".join(f"{key}: {value}" for key, value in params.items())
         logger.info(f"{formatted_params}")
 
+    def _parse_hedge_endpoint(self, endpoint):
+        """
+        Normalize a `hedge_api_bases` entry, either a URL or a table with `api_base` and
+        optional `api_key`/`api_version`. Missing credentials fall back to the primary ones.
+        """
+        if isinstance(endpoint, str):
+            endpoint = dict(api_base=endpoint)
+        elif not isinstance(endpoint, dict) or "api_base" not in endpoint:
+            raise ValueError(f"Unsupported hedge endpoint: {endpoint}. "
+                             "Use a URL or a table with `api_base`, `api_key` and `api_version`.")
+        return dict(
+            api_base=endpoint["api_base"],
+            api_key=endpoint.get("api_key") or self.api_key,
+            api_version=endpoint.get("api_version") or self.api_version,
+        )
+
+    def _get_async_client(self, api_base=None, api_key=None, api_version=None):
+        return client_pool.get_async_client(
+            self.api_type,
+            api_base or self.api_base,
+            api_version or self.api_version,
+            api_key or self.api_key,
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+            http2=self.http2,
+        )
+
+    def pool_stats(self):
+        """Connection counters of the shared pool used by this instance."""
+        key = client_pool.make_key(self.api_type, self.api_base, self.api_version, self.api_key)
+        return client_pool.stats(key)
+
     def _init_encoding(self):
         if self.api_type in [SupportAPI.AzureOpenAI, SupportAPI.OpenAI]:
             if self.modelname.startswith('gpt-4o'):
@@ -103,12 +236,6 @@ class WrapOpenAI:
 
     def _init_cache(self):
         if self.enable_cache:
-            if not self.cache_dir:
-                raise ValueError("caching is enabled but no cache directory is provided. "
-                                 f"cache_dir's value: {self.cache_dir}")
-
-            self.cache_dir = Path(self.cache_dir)
-            self.cache_dir.mkdir(exist_ok=True, parents=True)
             if self.cache_prefix:
                 cache_prefix = self.cache_prefix
             else:
@@ -117,10 +244,23 @@ class WrapOpenAI:
                 else:
                     cache_prefix = "default"
 
-            cache_path = self.cache_dir / f"{cache_prefix}.cache"
-            self.gpt_cache = CacheManager(cache_path, backup_interval=self.cache_interval)
+            self.gpt_cache = create_cache_backend(
+                self.cache_backend,
+                cache_dir=self.cache_dir,
+                cache_prefix=cache_prefix,
+                backup_interval=self.cache_interval,
+                num_shards=self.cache_shards,
+                url=self.cache_url,
+                ttl=self.cache_ttl,
+            )
+
+    def cache_stats(self):
+        return self.gpt_cache.stats() if self.enable_cache else None
 
     def infer(self, messages):
+        if self.hedger is not None:
+            return self.hedged_infer(messages)
+
         logger.debug(f"messages: {messages}")
         response = self._client.chat.completions.create(
             model=self.modelname,
@@ -132,12 +272,79 @@ class WrapOpenAI:
         )
         return parse_response(response)
 
-    def complete_with_retry(self, messages, sleep_eps=60, max_retry=3, every_step_sleep=0):
+    async def ainfer(self, messages, api_base=None, api_key=None, api_version=None):
+        response = await self._get_async_client(api_base, api_key, api_version).chat.completions.create(
+            model=self.modelname,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            timeout=self.timeout,
+            messages=messages
+        )
+        return parse_response(response)
+
+    def hedged_infer(self, messages):
+        """Same as `infer`, but a slow request is duplicated to another endpoint."""
+        logger.debug(f"messages: {messages}")
+        return self.hedger.run(lambda idx: self.ainfer(messages, **self._hedge_endpoints[idx]))
+
+    def scheduler_stats(self):
+        return self.scheduler.stats() if self.scheduler is not None else None
+
+    def hedge_stats(self):
+        return self.hedger.stats() if self.hedger is not None else None
+
+    def stream(self, messages, stop_predicate=None):
+        """
+        Stream the completion of `messages` as content deltas.
+
+        Args:
+            messages (list): Chat messages of one request.
+            stop_predicate (callable, optional): Called with the text assembled so far
+                after every delta; returning True cancels the request.
+
+        Returns:
+            ChatStream: Iterate it for the deltas, then read `text`, `ttft` and
+            `stopped_early` from it.
+        """
+        logger.debug(f"messages: {messages}")
+        return ChatStream(self, messages, stop_predicate=stop_predicate)
+
+    def astream(self, messages, stop_predicate=None):
+        """Async version of `stream`, use it with `async for`."""
+        logger.debug(f"messages: {messages}")
+        return AsyncChatStream(self, messages, stop_predicate=stop_predicate)
+
+    def infer_prompts(self, prompts):
+        """
+        Send several rendered prompts in one `/v1/completions` request.
+
+        Returns a list aligned with `prompts`; an entry is None when the server
+        did not return a usable choice for it.
+        """
+        logger.debug(f"prompts: {len(prompts)}")
+        response = self._client.completions.create(
+            model=self.modelname,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            top_p=self.top_p,
+            timeout=self.timeout,
+            prompt=prompts
+        )
+        return parse_completion_response(response, len(prompts))
+
+    def infer_prompt(self, prompt):
+        return self.infer_prompts([prompt])[0]
+
+    def complete_with_retry(self, messages, sleep_eps=60, max_retry=3, every_step_sleep=0, infer_fn=None):
         resp = None
+        if infer_fn is None:
+            infer_fn = self.infer
 
-        for _ in range(max_retry):
+        for attempt in range(max_retry):
+            delay = sleep_eps
             try:
-                resp = self.infer(messages)
+                resp = infer_fn(messages)
                 time.sleep(every_step_sleep)
                 break
             except BadRequestError as e:
@@ -146,24 +353,19 @@ class WrapOpenAI:
                 break
             except APITimeoutError as e:
                 logger.warning(f"APITimeoutError: {repr(e)}，delay {sleep_eps}s and retry.")
-                time.sleep(sleep_eps)
             except RateLimitError as e:
                 err_msg = repr(e)
                 reg = r"Please retry after (\d+) seconds"
                 nums = re.findall(reg, err_msg)
-                if len(nums) != 1:
-                    time.sleep(sleep_eps)
-                    continue
-                num = nums[0]
-                if not num.isdigit():
-                    time.sleep(sleep_eps)
-                server_eps = int(num)
-                logger.warning(f"{repr(e)}.\nExtraction time delayed, retrying after {server_eps}s.")
-                time.sleep(server_eps)
-
+                if len(nums) == 1 and nums[0].isdigit():
+                    delay = int(nums[0])
+                    logger.warning(f"{repr(e)}.\nExtraction time delayed, retrying after {delay}s.")
             except Exception as e:
                 logger.error(f"{repr(e)}, retrying after a delay of {sleep_eps}s.")
-                time.sleep(sleep_eps)
+
+            #   Nothing is retried after the last attempt, so don't keep the caller waiting.
+            if attempt < max_retry - 1:
+                time.sleep(delay)
 
         return resp
 
@@ -174,16 +376,180 @@ class WrapOpenAI:
         num_tokens = len(self.encoding.encode(string))
         return num_tokens
 
-    def chatcomplete(self, messages_list, verbose=False):
+    def estimate_num_tokens(self, string: str) -> int:
+        return len(string) // CHARS_PER_TOKEN + 1
+
+    def pack_batches(self, prompts):
+        """
+        Group `(idx, prompt)` pairs into batches bounded by `batch_max_prompts`
+        and by an estimated prompt token budget of `batch_max_tokens`.
+        """
+        batches = []
+        batch, batch_tokens = [], 0
+        for idx, prompt in prompts:
+            num_tokens = self.estimate_num_tokens(prompt)
+            if batch and (len(batch) >= self.batch_max_prompts
+                          or batch_tokens + num_tokens > self.batch_max_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append((idx, prompt))
+            batch_tokens += num_tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def batch_complete(self, messages_list, indices, verbose=False, on_response=None):
+        """
+        Complete `messages_list[idx]` for every idx in `indices` with multi-prompt requests.
+
+        Messages are rendered with the local chat template, packed into batches and
+        sent through the completions endpoint. Items missing from a batch response,
+        or every item of a failed batch, are retried one by one. The responses of
+        each batch are saved as soon as the batch is done, so an interrupted job
+        keeps what it has already paid for.
+        Returns a dict mapping idx to its response.
+        """
+        prompts = [(idx, self.chat_template.render(messages_list[idx])) for idx in indices]
+        batches = self.pack_batches(prompts)
+        logger.info(f"Packed {len(prompts)} prompts into {len(batches)} batches.")
+
+        if verbose:
+            batches = tqdm(batches)
+
+        results = {}
+        for batch in batches:
+            try:
+                batch_responses = self.infer_prompts([prompt for _, prompt in batch])
+            except Exception as e:
+                logger.warning(f"Batch request failed: {repr(e)}, retrying {len(batch)} prompts individually.")
+                batch_responses = [None] * len(batch)
+
+            batch_results = {}
+            for (idx, prompt), response in zip(batch, batch_responses):
+                if response is None or len(response) == 0:
+                    response = self.complete_with_retry(
+                        prompt, sleep_eps=10, max_retry=300, every_step_sleep=2, infer_fn=self.infer_prompt)
+                batch_results[idx] = response
+            self._save_responses(messages_list, batch_results, on_response)
+            results.update(batch_results)
+        return results
+
+    def chatcomplete(self, messages_list, verbose=False, output_parser=None, priority="batch", deadline=None):
+        """
+        Complete every messages in `messages_list`, serving cached responses when possible.
+
+        Args:
+            messages_list (list): A list of chat messages.
+            verbose (bool): Show a progress bar.
+            output_parser (callable, optional): Parses a response and raises on invalid
+                output. Responses that fail are evicted from the cache and re-queried
+                up to `max_requery` times.
+            priority (str): Priority class of the requests when the scheduler is enabled.
+            deadline (float, optional): Seconds from now after which a response is useless.
+                Only honored by the scheduler, which drops requests that can't make it.
+
+        Returns:
+            list: The responses, or the parsed values when `output_parser` is given.
+            An entry is None when no valid response was obtained.
+        """
+        #   Re-queries share the deadline of the first round instead of getting a fresh one.
+        deadline_time = time.monotonic() + deadline if deadline is not None else None
+        validator = None
+        on_response = None
+        if output_parser is not None:
+            validator = OutputValidator(output_parser, self._get_parse_executor())
+            on_response = validator.submit
+
+        if (priority != "batch" or deadline is not None) and (self.enable_batch or self.scheduler is None):
+            logger.warning(f"priority={priority} and deadline={deadline} are ignored: they are only honored "
+                           f"by the scheduler, which {'batch mode bypasses' if self.enable_batch else 'is disabled'}.")
+
+        if self.enable_batch:
+            responses = self.batch_chatcomplete(messages_list, verbose=verbose, on_response=on_response)
+        elif self.scheduler is not None:
+            responses = self.scheduled_chatcomplete(
+                messages_list, verbose=verbose, on_response=on_response, priority=priority, deadline=deadline)
+        else:
+            responses = self.sequential_chatcomplete(messages_list, verbose=verbose, on_response=on_response)
+
+        if validator is None:
+            return responses
+        return self.requery_invalid(
+            messages_list, validator, verbose=verbose, priority=priority, deadline_time=deadline_time)
+
+    def scheduled_complete(self, messages_list, indices, on_response=None, priority="batch", deadline=None,
+                           verbose=False):
+        """
+        Run the requests of `messages_list[idx]` for idx in `indices` through the scheduler.
+
+        Responses are saved as they complete. Requests dropped for their deadline get None.
+        Returns a dict mapping idx to its response.
+        """
+        #   Pacing is left to the scheduler; requests with a deadline are not worth long retries.
+        max_retry = 300 if deadline is None else 1
+        infer_fn = partial(self._timed_infer, priority=priority)
+        futures = {
+            self.scheduler.submit(
+                partial(self.complete_with_retry, messages_list[idx], sleep_eps=10, max_retry=max_retry,
+                        infer_fn=infer_fn),
+                priority=priority,
+                deadline=deadline,
+                timed=False,
+            ): idx
+            for idx in indices
+        }
+
+        completed = as_completed(futures)
+        if verbose:
+            completed = tqdm(completed, total=len(futures))
+
+        results = {}
+        for future in completed:
+            idx = futures[future]
+            try:
+                response = future.result()
+            except (DeadlineExceeded, CancelledError) as e:
+                logger.warning(f"Request {idx} is dropped: {repr(e)}")
+                response = None
+            results[idx] = self._save_response(idx, messages_list[idx], response, on_response)
+        return results
+
+    def _timed_infer(self, messages, priority="batch"):
+        """`infer` that reports its duration to the scheduler, leaving out retry sleeps."""
+        start_time = time.perf_counter()
+        response = self.infer(messages)
+        self.scheduler.record_latency(priority, time.perf_counter() - start_time)
+        return response
+
+    def scheduled_chatcomplete(self, messages_list, verbose=False, on_response=None, priority="batch", deadline=None):
+        responses = [None] * len(messages_list)
+
+        if self.enable_cache:
+            messages_keys = [json.dumps(messages) for messages in messages_list]
+            for idx, response in enumerate(self.gpt_cache.get_many(messages_keys)):
+                if response is not None and len(response) > 0:
+                    responses[idx] = response
+                    if on_response is not None:
+                        on_response(idx, response)
+
+        uncached_indices = [idx for idx, response in enumerate(responses) if response is None]
+        results = self.scheduled_complete(
+            messages_list, uncached_indices, on_response=on_response, priority=priority, deadline=deadline,
+            verbose=verbose)
+        for idx, response in results.items():
+            responses[idx] = response
+
+        return responses
+
+    def sequential_chatcomplete(self, messages_list, verbose=False, on_response=None):
         responses = [None] * len(messages_list)
 
         if verbose:
             messages_list = tqdm(messages_list)
 
         if self.enable_cache:
-            for idx, messages in enumerate(messages_list):
-                messages_key = json.dumps(messages)
-                response = self.gpt_cache.get_item(messages_key)
+            messages_keys = [json.dumps(messages) for messages in messages_list]
+            for idx, response in enumerate(self.gpt_cache.get_many(messages_keys)):
                 if response is not None and len(response) > 0:
                     responses[idx] = response
 
@@ -191,20 +557,117 @@ class WrapOpenAI:
             logger.debug(f"## input\n{messages}")
             if cached_response is not None:
                 logger.debug(f"## response(cached)\n{cached_response}")
+                if on_response is not None:
+                    on_response(idx, cached_response)
             else:
                 response = self.complete_with_retry(messages, sleep_eps=10, max_retry=300, every_step_sleep=2)
+                responses[idx] = self._save_response(idx, messages, response, on_response)
+
+        return responses
 
-                if response is not None:
-                    logger.debug(f"## response(new)\n{response}")
+    def batch_chatcomplete(self, messages_list, verbose=False, on_response=None):
+        responses = [None] * len(messages_list)
+
+        if self.enable_cache:
+            messages_keys = [json.dumps(messages) for messages in messages_list]
+            for idx, response in enumerate(self.gpt_cache.get_many(messages_keys)):
+                if response is not None and len(response) > 0:
                     responses[idx] = response
-                    if self.enable_cache:
-                        messages_key = json.dumps(messages)
-                        self.gpt_cache.set_item(key=messages_key, value=response)
-                else:
-                    logger.debug("## response(new)\nNone")
+                    if on_response is not None:
+                        on_response(idx, response)
+
+        uncached_indices = [idx for idx, response in enumerate(responses) if response is None]
+        logger.info(f"{len(messages_list) - len(uncached_indices)} cached, {len(uncached_indices)} to request.")
+
+        results = self.batch_complete(messages_list, uncached_indices, verbose=verbose, on_response=on_response)
+        for idx, response in results.items():
+            responses[idx] = response
 
         return responses
 
+    def _save_response(self, idx, messages, response, on_response=None):
+        """Cache a new response and hand it to `on_response`."""
+        if response is None:
+            logger.debug("## response(new)\nNone")
+            return None
+
+        logger.debug(f"## response(new)\n{response}")
+        if self.enable_cache:
+            messages_key = json.dumps(messages)
+            self.gpt_cache.set(messages_key, response)
+        if on_response is not None:
+            on_response(idx, response)
+        return response
+
+    def _save_responses(self, messages_list, results, on_response=None):
+        """Cache the new responses in `results`, a dict mapping idx to response, with a single write."""
+        results = {idx: response for idx, response in results.items() if response is not None}
+        for response in results.values():
+            logger.debug(f"## response(new)\n{response}")
+        if self.enable_cache and len(results) > 0:
+            self.gpt_cache.set_many(
+                (json.dumps(messages_list[idx]), response) for idx, response in results.items())
+        if on_response is not None:
+            for idx, response in results.items():
+                on_response(idx, response)
+
+    def _get_parse_executor(self):
+        if self._parse_executor is None:
+            if self.parse_in_processes:
+                self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+            else:
+                self._parse_executor = ThreadPoolExecutor(max_workers=self.parse_workers)
+        return self._parse_executor
+
+    def requery_invalid(self, messages_list, validator, verbose=False, priority="batch", deadline_time=None):
+        """
+        Collect the parsed responses, re-querying only the items that failed to parse.
+
+        Invalid responses are deleted from the cache so they are never served again.
+        With the scheduler, re-queries get the time left until `deadline_time`, a `time.monotonic()`
+        timestamp, and stop once it has passed.
+        """
+        parsed_responses = [None] * len(messages_list)
+        for requery_round in range(self.max_requery + 1):
+            parsed, failed = validator.collect()
+            for idx, value in parsed.items():
+                parsed_responses[idx] = value
+
+            if self.enable_cache:
+                for idx in failed:
+                    self.gpt_cache.delete(json.dumps(messages_list[idx]))
+
+            if len(failed) == 0:
+                break
+            if requery_round == self.max_requery:
+                logger.warning(f"{len(failed)} responses are still invalid after {self.max_requery} re-queries.")
+                break
+
+            use_scheduler = self.scheduler is not None and not self.enable_batch
+            deadline = None
+            if use_scheduler and deadline_time is not None:
+                deadline = deadline_time - time.monotonic()
+                if deadline <= 0:
+                    logger.warning(f"{len(failed)} responses are invalid and the deadline has passed.")
+                    break
+
+            logger.info(f"{len(failed)} responses failed to parse, "
+                        f"re-querying ({requery_round + 1}/{self.max_requery}).")
+            if use_scheduler:
+                self.scheduled_complete(messages_list, failed, on_response=validator.submit,
+                                        priority=priority, deadline=deadline)
+                continue
+
+            if self.enable_batch:
+                self.batch_complete(messages_list, failed, verbose=verbose, on_response=validator.submit)
+                continue
+
+            for idx in failed:
+                response = self.complete_with_retry(messages_list[idx], sleep_eps=10, max_retry=300, every_step_sleep=2)
+                self._save_response(idx, messages_list[idx], response, on_response=validator.submit)
+
+        return parsed_responses
+
 
 def parse_response(response):
     """解析API响应"""
@@ -213,3 +676,15 @@ def parse_response(response):
     except (AttributeError, IndexError):
         logger.error("Invalid response format")
         return None
+
+
+def parse_completion_response(response, num_prompts):
+    """Demultiplex a multi-prompt completion response by choice index."""
+    texts = [None] * num_prompts
+    try:
+        for choice in response.choices:
+            if 0 <= choice.index < num_prompts:
+                texts[choice.index] = choice.text
+    except (AttributeError, TypeError):
+        logger.error("Invalid completion response format")
+    return texts
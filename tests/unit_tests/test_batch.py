@@ -0,0 +1,100 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import json
+import re
+import tempfile
+from types import SimpleNamespace
+import pytest
+from llm_quiver.wrap_openai import WrapOpenAI, parse_completion_response
+from loguru import logger
+
+CHAT_TEMPLATE = str(Path(__file__).parent / "prompts" / "chatml.jinja2")
+
+
+def make_wrap(cache_dir=None, create=None, **kwargs):
+    wrap = WrapOpenAI(api_type="openai_like", api_key="sk-test", modelname="m", enable_cache=cache_dir is not None,
+                      cache_dir=cache_dir, enable_batch=True, chat_template=CHAT_TEMPLATE, **kwargs)
+    wrap._client = SimpleNamespace(completions=SimpleNamespace(create=create))
+    return wrap
+
+
+def completion(choices):
+    return SimpleNamespace(choices=[SimpleNamespace(index=index, text=text) for index, text in choices])
+
+
+def answer(prompt):
+    return "answer" + re.search(r"item(\d+)", prompt).group(1)
+
+
+def test_pack_batches():
+    wrap = make_wrap(batch_max_prompts=3, batch_max_tokens=25)
+    #   30 characters are estimated at 11 tokens, so two of them fill the token budget.
+    prompts = [(idx, "x" * 30) for idx in range(5)]
+    assert [[idx for idx, _ in batch] for batch in wrap.pack_batches(prompts)] == [[0, 1], [2, 3], [4]]
+
+    prompts = [(idx, "x") for idx in range(7)]
+    assert [[idx for idx, _ in batch] for batch in wrap.pack_batches(prompts)] == [[0, 1, 2], [3, 4, 5], [6]]
+
+    #   A prompt over the budget still gets a batch of its own.
+    prompts = [(0, "x"), (1, "x" * 300), (2, "x")]
+    assert [[idx for idx, _ in batch] for batch in wrap.pack_batches(prompts)] == [[0], [1], [2]]
+    assert wrap.pack_batches([]) == []
+
+
+def test_parse_completion_response():
+    response = completion([(2, "c"), (0, "a"), (1, "b")])
+    assert parse_completion_response(response, 3) == ["a", "b", "c"]
+
+    #   Missing and out of range choices leave None for the prompts they belong to.
+    response = completion([(3, "d"), (0, "a"), (7, "x")])
+    assert parse_completion_response(response, 4) == ["a", None, None, "d"]
+    assert parse_completion_response(SimpleNamespace(), 2) == [None, None]
+
+
+def test_retry_failed_batch_one_by_one():
+    batch_sizes = []
+
+    def create(**kwargs):
+        prompts = kwargs["prompt"]
+        batch_sizes.append(len(prompts))
+        if len(prompts) == 3:
+            raise RuntimeError("batch too large")
+        #   Only the first prompt gets a choice, so the second prompt of a batch of 2 is missing.
+        return completion([(0, answer(prompts[0]))])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        wrap = make_wrap(cache_dir, create, batch_max_prompts=3)
+        messages_list = [[{"role": "user", "content": f"item{n}"}] for n in range(5)]
+        responses = wrap.chatcomplete(messages_list)
+        logger.info(f"batch sizes: {batch_sizes}")
+        assert responses == [f"answer{n}" for n in range(5)]
+        #   The failed batch of 3 is retried one by one, then the missing item of the batch of 2.
+        assert batch_sizes == [3, 1, 1, 1, 2, 1]
+        keys = [json.dumps(messages) for messages in messages_list]
+        assert wrap.gpt_cache.get_many(keys) == responses
+
+
+def test_interrupted_job_keeps_finished_batches():
+    batch_sizes = []
+
+    def create(**kwargs):
+        batch_sizes.append(len(kwargs["prompt"]))
+        if len(batch_sizes) == 3:
+            raise KeyboardInterrupt
+        return completion([(idx, answer(prompt)) for idx, prompt in enumerate(kwargs["prompt"])])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        wrap = make_wrap(cache_dir, create, batch_max_prompts=2)
+        messages_list = [[{"role": "user", "content": f"item{n}"}] for n in range(6)]
+        with pytest.raises(KeyboardInterrupt):
+            wrap.chatcomplete(messages_list)
+        keys = [json.dumps(messages) for messages in messages_list]
+        assert wrap.gpt_cache.get_many(keys) == ["answer0", "answer1", "answer2", "answer3", None, None]
+
+
+if __name__ == "__main__":
+    test_pack_batches()
+    test_parse_completion_response()
+    test_retry_failed_batch_one_by_one()
+    test_interrupted_job_keeps_finished_batches()
@@ -0,0 +1,111 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import socketserver
+import tempfile
+import threading
+from llm_quiver.cache_backends import create_cache_backend
+from loguru import logger
+
+
+class RespKVHandler(socketserver.StreamRequestHandler):
+    """A stand-in key-value server speaking the subset of RESP used by the redis backend."""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        num_args = int(line[1:].strip())
+        args = []
+        for _ in range(num_args):
+            length = int(self.rfile.readline()[1:].strip())
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def write_bulk(self, value):
+        if value is None:
+            self.wfile.write(b"_\r\n" if self.protocol == 3 else b"$-1\r\n")
+        else:
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(value), value))
+
+    def handle(self):
+        store = self.server.store
+        self.protocol = 2
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b"GET":
+                self.write_bulk(store.get(args[1]))
+            elif command == b"MGET":
+                self.wfile.write(b"*%d\r\n" % (len(args) - 1))
+                for key in args[1:]:
+                    self.write_bulk(store.get(key))
+            elif command == b"SET":
+                store[args[1]] = args[2]
+                self.wfile.write(b"+OK\r\n")
+            elif command == b"HELLO":
+                self.protocol = int(args[1]) if len(args) > 1 else 2
+                self.wfile.write(b"%%1\r\n$5\r\nproto\r\n:%d\r\n" % self.protocol)
+            elif command == b"DEL":
+                num_deleted = sum(store.pop(key, None) is not None for key in args[1:])
+                self.wfile.write(b":%d\r\n" % num_deleted)
+            else:
+                self.wfile.write(b"+OK\r\n")
+
+
+def start_kv_server():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), RespKVHandler)
+    server.daemon_threads = True
+    server.store = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def check_backend(cache):
+    keys = [f'[{{"role": "user", "content": "q{idx}"}}]' for idx in range(20)]
+    assert cache.get(keys[0]) is None
+
+    cache.set(keys[0], "a0")
+    cache.set_many([(key, f"a{idx}") for idx, key in enumerate(keys[1:10], start=1)])
+    cache.set(keys[10], "")
+    assert cache.get(keys[0]) == "a0"
+    assert cache.get_many(keys[:12]) == [f"a{idx}" for idx in range(10)] + [None, None]
+
+    cache.delete(keys[0])
+    assert cache.get(keys[0]) is None
+    logger.info(f"stats: {cache.stats()}")
+
+
+def test_sqlite_backend():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = create_cache_backend("sqlite", cache_dir=cache_dir, cache_prefix="test")
+        check_backend(cache)
+        cache.close()
+
+
+def test_sharded_sqlite_backend():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = create_cache_backend("sharded_sqlite", cache_dir=cache_dir, cache_prefix="test", num_shards=4)
+        check_backend(cache)
+        assert len(list(Path(cache_dir).glob("test.*.cache"))) == 4
+        assert sum(count > 0 for count in cache.stats()["shard_counts"]) > 1
+        cache.close()
+
+
+def test_redis_backend():
+    server = start_kv_server()
+    host, port = server.server_address
+    try:
+        cache = create_cache_backend("redis", cache_prefix="test", url=f"redis://{host}:{port}/0")
+        check_backend(cache)
+        cache.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    test_sqlite_backend()
+    test_sharded_sqlite_backend()
+    test_redis_backend()
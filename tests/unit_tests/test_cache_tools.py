@@ -0,0 +1,73 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import tempfile
+import pytest
+from llm_quiver.cache_manager import CacheManager
+from llm_quiver.cache_tools import export_cache, import_cache, merge_caches, main
+
+
+def make_cache(cache_path, items):
+    cache = CacheManager(cache_path)
+    cache.set_many(items)
+    cache.close()
+
+
+def read_cache(cache_path):
+    cache = CacheManager(cache_path)
+    items = dict(cache.conn.execute("SELECT key, value FROM kv_cache").fetchall())
+    cache.close()
+    return items
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz", ".parquet"])
+def test_export_import(suffix):
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        items = [(f"key{idx}", f"中文 value {idx}") for idx in range(250)]
+        make_cache(tmp_dir / "src.cache", items)
+
+        assert export_cache(tmp_dir / "src.cache", tmp_dir / f"export{suffix}", chunk_size=100) == 250
+        make_cache(tmp_dir / "dst.cache", [("key0", "old"), ("other", "kept")])
+        assert import_cache(tmp_dir / f"export{suffix}", tmp_dir / "dst.cache", on_conflict="keep", chunk_size=100) == 250
+
+        merged = read_cache(tmp_dir / "dst.cache")
+        assert len(merged) == 251
+        assert merged["key0"] == "old"
+        assert merged["key249"] == "中文 value 249"
+
+
+def test_merge_policies():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        make_cache(tmp_dir / "node1.cache", [("a", "short"), ("b", "node1")])
+        make_cache(tmp_dir / "node2.cache", [("a", "much longer"), ("c", "node2")])
+
+        for on_conflict, expected in [("replace", "much longer"), ("keep", "short"), ("longest", "much longer")]:
+            dst = tmp_dir / f"{on_conflict}.cache"
+            num_rows = merge_caches(dst, [tmp_dir / "node1.cache", tmp_dir / "node2.cache"], on_conflict=on_conflict)
+            assert num_rows == 3
+            assert read_cache(dst)["a"] == expected
+
+        make_cache(tmp_dir / "node3.cache", [("a", "s")])
+        merge_caches(tmp_dir / "longest.cache", [tmp_dir / "node3.cache"], on_conflict="longest")
+        assert read_cache(tmp_dir / "longest.cache")["a"] == "much longer"
+
+
+def test_cli():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tmp_dir = Path(tmp_dir)
+        make_cache(tmp_dir / "node1.cache", [("a", "node1")])
+        make_cache(tmp_dir / "node2.cache", [("b", "node2")])
+        main(["merge", str(tmp_dir / "all.cache"), str(tmp_dir / "node1.cache"), str(tmp_dir / "node2.cache")])
+        main(["export", str(tmp_dir / "all.cache"), str(tmp_dir / "all.jsonl.gz")])
+        main(["import", str(tmp_dir / "all.jsonl.gz"), str(tmp_dir / "copy.cache")])
+        assert read_cache(tmp_dir / "copy.cache") == {"a": "node1", "b": "node2"}
+
+
+if __name__ == "__main__":
+    test_export_import(".jsonl.gz")
+    test_merge_policies()
+    test_cli()
@@ -0,0 +1,108 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from llm_quiver.client_pool import ClientPool, PoolStats, _build_http_client
+from llm_quiver.support_api import SupportAPI
+from loguru import logger
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_connection_counters():
+    server, url = start_server()
+    try:
+        stats = PoolStats()
+        with _build_http_client(stats, max_connections=10, max_keepalive_connections=5,
+                                keepalive_expiry=30.0, http2=False) as http_client:
+            for _ in range(5):
+                assert http_client.get(url).status_code == 200
+        counters = stats.as_dict()
+        logger.info(f"pool stats: {counters}")
+        assert counters["requests"] == 5
+        assert counters["connections_opened"] == 1
+        assert counters["tls_handshakes"] == 0
+        assert counters["reuse_ratio"] == 0.8
+
+        #   Without keep-alive every request opens a new connection.
+        stats = PoolStats()
+        with _build_http_client(stats, max_connections=10, max_keepalive_connections=0,
+                                keepalive_expiry=30.0, http2=False) as http_client:
+            for _ in range(3):
+                http_client.get(url)
+        assert stats.as_dict()["connections_opened"] == 3
+        assert stats.as_dict()["reuse_ratio"] == 0.0
+    finally:
+        server.shutdown()
+
+
+def test_clients_are_shared_by_key():
+    pool = ClientPool()
+    client = pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a")
+    assert pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a") is client
+    assert pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-b") is not client
+    assert pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:2/v1", None, "sk-a") is not client
+
+    key = ClientPool.make_key(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a")
+    assert "sk-a" not in str(key)
+    assert pool.stats(key) == {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "reuse_ratio": 0.0}
+    assert pool.stats(ClientPool.make_key(SupportAPI.OpenAILike, "http://127.0.0.1:3/v1", None, "sk-a")) is None
+    assert len(pool.stats()) == 3
+
+
+def test_options_mismatch_warning():
+    pool = ClientPool()
+    warnings = []
+    sink_id = logger.add(lambda message: warnings.append(message), level="WARNING")
+    try:
+        client = pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a", max_connections=10)
+        assert pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a",
+                               max_connections=10) is client
+        assert len(warnings) == 0
+        assert pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a",
+                               max_connections=50) is client
+        assert len(warnings) == 1 and "ignoring" in warnings[0]
+    finally:
+        logger.remove(sink_id)
+
+
+def test_thread_safe_creation():
+    pool = ClientPool()
+    barrier = threading.Barrier(16)
+
+    def get_client(_):
+        barrier.wait()
+        return pool.get_client(SupportAPI.OpenAILike, "http://127.0.0.1:1/v1", None, "sk-a")
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        clients = list(executor.map(get_client, range(16)))
+    assert all(client is clients[0] for client in clients)
+    assert len(pool.stats()) == 1
+
+
+if __name__ == "__main__":
+    test_connection_counters()
+    test_clients_are_shared_by_key()
+    test_options_mismatch_warning()
+    test_thread_safe_creation()
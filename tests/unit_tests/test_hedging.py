@@ -0,0 +1,86 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import asyncio
+import time
+import pytest
+from llm_quiver.hedging import RequestHedger
+from loguru import logger
+
+
+def make_request_fn(delays, calls, cancelled):
+    async def request(idx):
+        calls.append(idx)
+        try:
+            await asyncio.sleep(delays[idx])
+        except asyncio.CancelledError:
+            cancelled.append(idx)
+            raise
+        return f"endpoint{idx}"
+
+    return request
+
+
+def warm_up(hedger, num_requests=20):
+    calls, cancelled = [], []
+    for _ in range(num_requests):
+        assert hedger.run(make_request_fn([0.01, 0.01], calls, cancelled)) == "endpoint0"
+    assert cancelled == []
+
+
+def test_hedge_slow_request():
+    hedger = RequestHedger(num_endpoints=2, percentile=90, budget=0.5, min_samples=10)
+    warm_up(hedger)
+
+    calls, cancelled = [], []
+    assert hedger.run(make_request_fn([5, 0.01], calls, cancelled)) == "endpoint1"
+    assert calls == [0, 1]
+    assert cancelled == [0]
+    logger.info(f"stats: {hedger.stats()}")
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_record_cancelled_primary():
+    hedger = RequestHedger(num_endpoints=2, percentile=90, budget=0.5, min_samples=10)
+    warm_up(hedger)
+    hedge_delay = hedger.stats()["hedge_delay"]
+
+    calls, cancelled = [], []
+    assert hedger.run(make_request_fn([5, 0.01], calls, cancelled)) == "endpoint1"
+    #   The cancelled primary is recorded on the hedger loop once the cancellation is delivered,
+    #   after the winning hedge.
+    for _ in range(100):
+        if len(hedger.latency._latencies) == 22:
+            break
+        time.sleep(0.01)
+    primary_latency = hedger.latency._latencies[-1]
+    logger.info(f"hedge_delay: {hedge_delay:.3f}s, cancelled primary: {primary_latency:.3f}s")
+    assert len(hedger.latency._latencies) == 22
+    assert hedge_delay < primary_latency < 5
+
+
+def test_hedge_budget():
+    hedger = RequestHedger(num_endpoints=2, percentile=90, budget=0.0, min_samples=10)
+    warm_up(hedger)
+
+    calls, cancelled = [], []
+    assert hedger.run(make_request_fn([0.2, 0.01], calls, cancelled)) == "endpoint0"
+    assert calls == [0]
+    assert hedger.stats()["hedges"] == 0
+
+
+def test_hedge_errors():
+    hedger = RequestHedger(num_endpoints=1, min_samples=10)
+
+    async def failing(idx):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        hedger.run(failing)
+
+
+if __name__ == "__main__":
+    test_hedge_slow_request()
+    test_record_cancelled_primary()
+    test_hedge_budget()
+    test_hedge_errors()
@@ -42,6 +42,43 @@ def test_toml_llm_quiver():
     logger.info(f"responses type: {type(responses)}, {type(responses[0])}")
 
 
+def test_batch_llm_quiver():
+    llm = TomlLLMQuiver(
+        config_path="tests/unit_tests/configs/vllm_batch.toml",
+        toml_template_file="tests/unit_tests/prompts/messages_test.toml",
+        toml_prompt_name="joke_template"
+    )
+    prompt_values = [dict(word=word) for word in ["马斯克", "内卷", "躺平"]]
+    responses = llm.chat(prompt_values=prompt_values)
+    logger.info(f"responses: {responses}")
+    assert len(responses) == len(prompt_values)
+
+
+def test_stream_llm_quiver():
+    llm = LLMQuiver(config_path="tests/unit_tests/configs/vllm.toml")
+    messages = [{"role": "user", "content": "用一句话介绍你自己"}]
+    stream = llm.stream(messages)
+    for delta in stream:
+        logger.info(f"delta: {delta}")
+    logger.info(f"text: {stream.text}, ttft: {stream.ttft}")
+
+    stream = llm.stream(messages, stop_predicate=lambda text: len(text) > 5)
+    text = "".join(stream)
+    logger.info(f"text: {text}, stopped_early: {stream.stopped_early}")
+
+
+def test_output_parser_llm_quiver():
+    import json
+    llm = LLMQuiver(config_path="tests/unit_tests/configs/vllm.toml", output_parser=json.loads)
+    messages_list = [[{"role": "user", "content": f"只输出 JSON：{{\"number\": {idx}}}"}] for idx in range(3)]
+    responses = llm.chat(messages_list)
+    logger.info(f"responses: {responses}")
+    assert all(response is None or isinstance(response, dict) for response in responses)
+
+
 if __name__ == "__main__":
     test_llm_quiver()
     test_toml_llm_quiver()
+    test_batch_llm_quiver()
+    test_stream_llm_quiver()
+    test_output_parser_llm_quiver()
@@ -0,0 +1,94 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import json
+import re
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+from llm_quiver.wrap_openai import WrapOpenAI
+from loguru import logger
+
+CHAT_TEMPLATE = str(Path(__file__).parent / "prompts" / "chatml.jinja2")
+
+
+class FakeServer:
+    """
+    Answer `item<n>` with `{"n": n}`, except that every item in `invalid_times`
+    gets a non-JSON answer the given number of times first.
+    """
+
+    def __init__(self, invalid_times):
+        self.invalid_times = dict(invalid_times)
+        self.calls = Counter()
+
+    def answer(self, text):
+        n = int(re.search(r"item(\d+)", text).group(1))
+        self.calls[n] += 1
+        if self.calls[n] <= self.invalid_times.get(n, 0):
+            return f"Sure! Here is item {n}."
+        return json.dumps({"n": n})
+
+    def chat_create(self, **kwargs):
+        message = SimpleNamespace(content=self.answer(kwargs["messages"][-1]["content"]))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def completions_create(self, **kwargs):
+        choices = [SimpleNamespace(index=idx, text=self.answer(prompt)) for idx, prompt in enumerate(kwargs["prompt"])]
+        return SimpleNamespace(choices=choices)
+
+
+def make_wrap(cache_dir, server, **kwargs):
+    wrap = WrapOpenAI(api_type="openai_like", api_key="sk-test", modelname="m", enable_cache=True,
+                      cache_dir=cache_dir, max_requery=2, **kwargs)
+    wrap._client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=server.chat_create)),
+        completions=SimpleNamespace(create=server.completions_create),
+    )
+    return wrap
+
+
+def check_requery(cache_dir, **kwargs):
+    #   item1 is fixed by one re-query, item2 never parses, item0 and item3 are valid at once.
+    server = FakeServer({1: 1, 2: 100})
+    wrap = make_wrap(cache_dir, server, **kwargs)
+    messages_list = [[{"role": "user", "content": f"item{n}"}] for n in range(4)]
+
+    parsed = wrap.chatcomplete(messages_list, output_parser=json.loads)
+    logger.info(f"parsed: {parsed}, calls: {server.calls}")
+    assert parsed == [{"n": 0}, {"n": 1}, None, {"n": 3}]
+    #   Only failed items are re-queried, and at most max_requery times.
+    assert server.calls == Counter({0: 1, 1: 2, 2: 3, 3: 1})
+
+    #   The invalid response is evicted, the valid ones are cached.
+    keys = [json.dumps(messages) for messages in messages_list]
+    assert wrap.gpt_cache.get_many(keys) == ['{"n": 0}', '{"n": 1}', None, '{"n": 3}']
+
+    #   A second run is served from the cache, except for the item that never parsed.
+    assert wrap.chatcomplete(messages_list, output_parser=json.loads) == parsed
+    assert server.calls == Counter({0: 1, 1: 2, 2: 6, 3: 1})
+    return wrap
+
+
+def test_requery_sequential():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        check_requery(cache_dir)
+
+
+def test_requery_batch():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        check_requery(cache_dir, enable_batch=True, batch_max_prompts=2, chat_template=CHAT_TEMPLATE)
+
+
+def test_requery_scheduler():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        wrap = check_requery(cache_dir, scheduler_workers=2)
+        #   4 + 2 + 1 requests in the first run, 1 + 1 + 1 for item2 in the second one.
+        assert wrap.scheduler_stats()["batch"]["dispatched"] == 10
+        wrap.scheduler.close()
+
+
+if __name__ == "__main__":
+    test_requery_sequential()
+    test_requery_batch()
+    test_requery_scheduler()
@@ -0,0 +1,221 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import json
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from llm_quiver.scheduler import DeadlineExceeded, RequestScheduler
+from llm_quiver.wrap_openai import WrapOpenAI
+from loguru import logger
+
+
+def test_interactive_preempts_batch():
+    scheduler = RequestScheduler(num_workers=1, priority_shares={"interactive": 1.0, "batch": 1.0})
+    order = []
+    gate = threading.Event()
+
+    def request(name):
+        def fn():
+            gate.wait()
+            order.append(name)
+            return name
+        return fn
+
+    futures = [scheduler.submit(request(f"batch{idx}"), priority="batch") for idx in range(3)]
+    time.sleep(0.1)
+    futures.append(scheduler.submit(request("interactive"), priority="interactive"))
+    gate.set()
+    assert [future.result(timeout=5) for future in futures] == ["batch0", "batch1", "batch2", "interactive"]
+    #   batch0 was already running, interactive goes before the queued batch work.
+    assert order == ["batch0", "interactive", "batch1", "batch2"]
+    scheduler.close()
+
+
+def test_batch_share_leaves_worker_for_interactive():
+    scheduler = RequestScheduler(num_workers=4, priority_shares={"interactive": 1.0, "batch": 0.5})
+    interactive_gate, batch_gate = threading.Event(), threading.Event()
+    interactive = scheduler.submit(interactive_gate.wait, priority="interactive")
+    time.sleep(0.05)
+    batch_futures = [scheduler.submit(batch_gate.wait, priority="batch") for _ in range(8)]
+    time.sleep(0.1)
+    #   Interactive work is running, so batch keeps to its share and leaves a worker free.
+    assert scheduler.stats()["batch"]["in_flight"] == 2
+    assert scheduler.submit(lambda: "fast", priority="interactive").result(timeout=1) == "fast"
+
+    #   Once interactive is idle, batch borrows every worker.
+    interactive_gate.set()
+    interactive.result(timeout=5)
+    time.sleep(0.1)
+    assert scheduler.stats()["batch"]["in_flight"] == 4
+    batch_gate.set()
+    for future in batch_futures:
+        future.result(timeout=5)
+    logger.info(f"stats: {scheduler.stats()}")
+    scheduler.close()
+
+
+def test_drop_expired_deadline():
+    scheduler = RequestScheduler(num_workers=1, latency_min_samples=3)
+    blocker = scheduler.submit(lambda: time.sleep(0.3), priority="batch")
+    time.sleep(0.05)
+    late = scheduler.submit(lambda: "late", priority="interactive", deadline=0.1)
+    blocker.result(timeout=5)
+    with pytest.raises(DeadlineExceeded):
+        late.result(timeout=5)
+
+    #   Interactive requests take about 0.3s, so a 0.2s deadline can't be met even with a free worker.
+    for _ in range(3):
+        scheduler.record_latency("interactive", 0.3)
+    with pytest.raises(DeadlineExceeded):
+        scheduler.submit(lambda: "late", priority="interactive", deadline=0.2).result(timeout=5)
+    assert scheduler.stats()["interactive"]["dropped"] == 2
+    scheduler.close()
+
+
+def test_cancel_queued_request():
+    scheduler = RequestScheduler(num_workers=1)
+    blocker = scheduler.submit(lambda: time.sleep(0.3), priority="batch")
+    time.sleep(0.05)
+    cancelled = scheduler.submit(lambda: "cancelled", priority="interactive", deadline=0.1)
+    assert cancelled.cancel()
+    blocker.result(timeout=5)
+
+    #   The worker survives the cancelled entry and keeps serving requests.
+    assert scheduler.submit(lambda: "next", priority="interactive", deadline=1.0).result(timeout=2) == "next"
+    assert scheduler.stats()["interactive"]["dropped"] == 0
+    assert scheduler.stats()["interactive"]["queued"] == 0
+    scheduler.close()
+
+
+def test_latency_is_per_class():
+    scheduler = RequestScheduler(num_workers=2, latency_min_samples=3)
+    for _ in range(3):
+        scheduler.submit(lambda: time.sleep(0.3), priority="batch").result(timeout=5)
+    assert scheduler.expected_latency("batch") >= 0.3
+    assert scheduler.expected_latency("interactive") == 0.0
+    assert scheduler.submit(lambda: "fast", priority="interactive", deadline=0.2).result(timeout=5) == "fast"
+    scheduler.close()
+
+
+def test_recover_from_slow_outlier():
+    scheduler = RequestScheduler(num_workers=1, latency_min_samples=3, probe_every=3)
+    #   A single slow request is not enough to drop anything.
+    scheduler.submit(lambda: time.sleep(1.0), priority="interactive").result(timeout=5)
+    assert scheduler.submit(lambda: "fast", priority="interactive", deadline=0.5).result(timeout=5) == "fast"
+
+    #   Even when slow samples dominate, probes bring the estimate back down.
+    for _ in range(3):
+        scheduler.record_latency("interactive", 1.0)
+    results = []
+    for _ in range(30):
+        try:
+            results.append(scheduler.submit(lambda: "fast", priority="interactive", deadline=0.5).result(timeout=5))
+        except DeadlineExceeded:
+            results.append(None)
+    logger.info(f"results: {results}")
+    assert results[0] is None
+    assert results[-10:] == ["fast"] * 10
+    assert scheduler.expected_latency("interactive") < 0.5
+    scheduler.close()
+
+
+def test_failed_deadline_request_returns_at_once():
+    def create(**kwargs):
+        raise RuntimeError("connection reset")
+
+    wrap = WrapOpenAI(api_type="openai", api_key="sk-test", modelname="gpt-4o", scheduler_workers=1)
+    wrap._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    messages = [{"role": "user", "content": "hi"}]
+    start_time = time.monotonic()
+    assert wrap.chatcomplete([messages], priority="interactive", deadline=1.0) == [None]
+    #   A single attempt and no retry sleep, so the worker is free again right away.
+    assert time.monotonic() - start_time < 1.0
+    wrap.scheduler.close()
+
+
+def test_requery_keeps_the_first_deadline():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(time.monotonic())
+        time.sleep(0.2)
+        message = SimpleNamespace(content="not json")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    wrap = WrapOpenAI(api_type="openai", api_key="sk-test", modelname="gpt-4o", scheduler_workers=1, max_requery=5)
+    wrap._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    messages = [{"role": "user", "content": "hi"}]
+    start_time = time.monotonic()
+    assert wrap.chatcomplete([messages], output_parser=json.loads, priority="interactive", deadline=0.5) == [None]
+    #   Every round re-queries within the time left, not within a fresh 0.5s.
+    assert len(calls) <= 3
+    assert all(call_time - start_time < 0.5 for call_time in calls)
+    wrap.scheduler.close()
+
+
+def test_schedulers_are_shared_by_quota():
+    first = WrapOpenAI(api_type="openai", api_key="sk-shared", modelname="gpt-4o", scheduler_workers=2,
+                       requests_per_minute=600)
+    second = WrapOpenAI(api_type="openai", api_key="sk-shared", modelname="gpt-4o", scheduler_workers=2,
+                        requests_per_minute=600)
+    other_model = WrapOpenAI(api_type="openai", api_key="sk-shared", modelname="gpt-4o-mini", scheduler_workers=2)
+    assert first.scheduler is second.scheduler
+    assert other_model.scheduler is not first.scheduler
+
+    warnings = []
+    sink_id = logger.add(lambda message: warnings.append(message), level="WARNING")
+    try:
+        third = WrapOpenAI(api_type="openai", api_key="sk-shared", modelname="gpt-4o", scheduler_workers=4)
+        assert third.scheduler is first.scheduler
+        assert any("ignoring" in message for message in warnings)
+
+        warnings.clear()
+        plain = WrapOpenAI(api_type="openai", api_key="sk-shared", modelname="gpt-4o")
+        plain._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))]))))
+        assert plain.chatcomplete([[{"role": "user", "content": "hi"}]], priority="interactive") == ["ok"]
+        assert any("ignored" in message for message in warnings)
+    finally:
+        logger.remove(sink_id)
+    first.scheduler.close()
+    other_model.scheduler.close()
+
+
+def test_rate_limit_share():
+    scheduler = RequestScheduler(num_workers=4, requests_per_minute=600,
+                                 priority_shares={"interactive": 1.0, "batch": 0.5})
+    gate = threading.Event()
+    interactive = scheduler.submit(gate.wait, priority="interactive")
+    start_time = time.monotonic()
+    futures = [scheduler.submit(lambda: None, priority="batch") for _ in range(15)]
+    for future in futures:
+        future.result(timeout=10)
+    #   While interactive is busy, batch gets 5 requests per second with a burst of 5:
+    #   the last one waits about 2 seconds.
+    assert time.monotonic() - start_time > 1.5
+    gate.set()
+    interactive.result(timeout=5)
+
+    #   Alone, batch borrows the whole rate of 10 requests per second with a burst of 10.
+    time.sleep(1.0)
+    start_time = time.monotonic()
+    futures = [scheduler.submit(lambda: None, priority="batch") for _ in range(15)]
+    for future in futures:
+        future.result(timeout=10)
+    assert time.monotonic() - start_time < 1.0
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    test_interactive_preempts_batch()
+    test_batch_share_leaves_worker_for_interactive()
+    test_drop_expired_deadline()
+    test_cancel_queued_request()
+    test_latency_is_per_class()
+    test_recover_from_slow_outlier()
+    test_failed_deadline_request_returns_at_once()
+    test_requery_keeps_the_first_deadline()
+    test_schedulers_are_shared_by_quota()
+    test_rate_limit_share()
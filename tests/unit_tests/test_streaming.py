@@ -0,0 +1,136 @@
+from pathlib import Path
+import sys
+sys.path.append(str(Path(__file__).parent.parent.parent))
+import asyncio
+import tempfile
+import time
+from types import SimpleNamespace
+from llm_quiver.wrap_openai import WrapOpenAI
+from loguru import logger
+
+DELTAS = ["Label", ": ", "POSITIVE", " because", " it", " is", " great"]
+
+
+def make_chunks():
+    #   The first chunk has no choices, like Azure's content filter results.
+    chunks = [SimpleNamespace(choices=[])]
+    for delta in DELTAS:
+        chunks.append(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))]))
+    return chunks
+
+
+class FakeStream:
+    def __init__(self, delay):
+        self.chunks = make_chunks()
+        self.delay = delay
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            time.sleep(self.delay)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncStream(FakeStream):
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, stream_cls=FakeStream, delay=0.01):
+        self.stream_cls = stream_cls
+        self.delay = delay
+        self.streams = []
+
+    def create(self, **kwargs):
+        if kwargs.get("stream"):
+            stream = self.stream_cls(self.delay)
+            self.streams.append(stream)
+            return stream
+        text = "".join(DELTAS)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **kwargs):
+        return super().create(**kwargs)
+
+
+def make_wrap(cache_dir, completions):
+    wrap = WrapOpenAI(api_type="openai", api_key="sk-test", modelname="gpt-4o",
+                      enable_cache=True, cache_dir=cache_dir)
+    wrap._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return wrap
+
+
+def test_stream_ttft_and_cache():
+    messages = [{"role": "user", "content": "Classify: I love it."}]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        completions = FakeCompletions()
+        wrap = make_wrap(cache_dir, completions)
+
+        stream = wrap.stream(messages)
+        assert list(stream) == DELTAS
+        assert stream.text == "".join(DELTAS)
+        assert 0 < stream.ttft <= stream.total_time
+        assert not stream.stopped_early
+        assert completions.streams[0].closed
+
+        stream = wrap.stream(messages)
+        assert list(stream) == ["".join(DELTAS)]
+        assert stream.cached and stream.ttft == 0.0
+        assert len(completions.streams) == 1
+        assert wrap.chatcomplete([messages]) == ["".join(DELTAS)]
+
+
+def test_stream_early_stop_is_not_cached():
+    messages = [{"role": "user", "content": "Classify: I love it."}]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        completions = FakeCompletions()
+        wrap = make_wrap(cache_dir, completions)
+
+        stream = wrap.stream(messages, stop_predicate=lambda text: "POSITIVE" in text)
+        assert "".join(stream) == "Label: POSITIVE"
+        assert stream.stopped_early
+        assert completions.streams[0].closed
+
+        #   The partial text must not be served to the non-streaming path.
+        assert wrap.chatcomplete([messages]) == ["".join(DELTAS)]
+        logger.info(f"cache stats: {wrap.cache_stats()}")
+
+
+def test_astream():
+    messages = [{"role": "user", "content": "Classify: I love it."}]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        completions = FakeAsyncCompletions(stream_cls=FakeAsyncStream)
+        wrap = make_wrap(cache_dir, completions)
+        wrap._get_async_client = lambda api_base=None: SimpleNamespace(
+            chat=SimpleNamespace(completions=completions))
+
+        async def consume(stop_predicate=None):
+            stream = wrap.astream(messages, stop_predicate=stop_predicate)
+            deltas = [delta async for delta in stream]
+            return stream, deltas
+
+        stream, deltas = asyncio.run(consume(stop_predicate=lambda text: "POSITIVE" in text))
+        assert deltas == DELTAS[:3] and stream.stopped_early and stream.ttft > 0
+        assert completions.streams[0].closed
+
+        stream, deltas = asyncio.run(consume())
+        assert deltas == DELTAS and not stream.cached
+        stream, deltas = asyncio.run(consume())
+        assert stream.cached and deltas == ["".join(DELTAS)]
+
+
+if __name__ == "__main__":
+    test_stream_ttft_and_cache()
+    test_stream_early_stop_is_not_cached()
+    test_astream()